@@ -0,0 +1,95 @@
+#!/usr/bin/python
+"""
+Movie and actor associations learned during a run.
+
+Every cast list and filmography fetched while solving a puzzle is saved
+in an AssocGraph.  Later questions about the same movie or actor are
+answered from memory instead of fetching and parsing the page again.
+"""
+import scan_exp
+import word_index
+
+
+class AssocGraph:
+    """
+    Bipartite graph of movies and actors, indexed by imdb link.
+
+    fetched holds the list read from each entity's own page (the cast of
+    a movie, or the movies of an actor) as a dictionary of names indexed
+    by link.  edges holds the links known from both directions: when a
+    movie's cast is read, each actor in it is also linked back to that
+    movie, so the two directions never disagree.  indexes holds the word
+    length index (see word_index.build_index) of each fetched list.
+    """
+    def __init__(self):
+        self.fetched = {}
+        self.edges = {}
+        self.indexes = {}
+        self.fetches = 0
+
+    def associated(self, link, is_movie):
+        """
+        Return the associations of a movie or actor.
+
+        Arguments:
+            link -- imdb link of the movie or actor
+            is_movie -- True if link is a movie
+
+        Returns a dictionary of names indexed by imdb link.  The page is
+        only fetched the first time that link is asked for.
+        """
+        if link not in self.fetched:
+            self.record(link, fetch(link, is_movie))
+        return self.fetched[link]
+
+    def record(self, link, alist):
+        """
+        Save the [name, link] list read from the page of link.
+        """
+        self.fetches += 1
+        found = {}
+        for entry in alist:
+            found.setdefault(entry[1], entry[0])
+        self.fetched[link] = found
+        self.indexes[link] = word_index.build_index(
+            [[name, other] for other, name in found.items()])
+        self.edges.setdefault(link, set()).update(found)
+        for other in found:
+            self.edges.setdefault(other, set()).add(link)
+
+    def index(self, link, is_movie):
+        """
+        Return the word length index of the associations of link.
+        """
+        self.associated(link, is_movie)
+        return self.indexes[link]
+
+    def connected(self, link, other, is_movie):
+        """
+        Return True if two entities are linked, in either direction.
+
+        Links already known from either entity's page are used first, so
+        the page of link is only fetched when no page read so far links
+        the two (the two pages of a pair do not always agree).
+
+        Arguments:
+            link -- imdb link of a movie or actor (fetched if needed)
+            other -- imdb link of an entity of the other kind
+            is_movie -- True if link is a movie
+        """
+        if other in self.edges.get(link, ()):
+            return True
+        self.associated(link, is_movie)
+        return other in self.edges[link]
+
+
+def fetch(link, is_movie):
+    """
+    Read the [name, link] list of a movie's cast or an actor's movies.
+
+    This does not change any AssocGraph, so it can be called from several
+    threads at once.  The result is saved with AssocGraph.record().
+    """
+    if is_movie:
+        return scan_exp.get_actor_from_movie(link)
+    return scan_exp.get_movie_from_actor(link)
@@ -0,0 +1,140 @@
+#!/usr/bin/python
+"""
+Solver that reads the imdb pages of a whole frontier at once.
+
+solve_nodes.Propagator handles one worklist figure at a time, and reads
+the cast or filmography of each of its possible values one after the
+other.  Nearly all of that time is spent waiting for imdb.
+AsyncPropagator first collects every page that the figures now in the
+worklist (the frontier) will need, reads them concurrently with asyncio,
+and then processes the frontier in the same order as Propagator.  Since
+the pages read do not depend on the order in which they arrive, the
+answers are the same as those of the serial solver.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import assoc_graph
+import fetch_scheduler
+import imdb_dataset
+import solve_nodes
+
+FETCH_LIMIT = 8
+
+
+class AsyncPropagator(solve_nodes.Propagator):
+    """
+    Propagator that prefetches the pages of each frontier concurrently.
+
+    At most limit pages are read at the same time.  Each page's
+    fetch_scheduler priority is the number of possible values of the
+    figure that needs it, so the most constrained figures' pages are read
+    first when the site is being paced.  A few pages may be read that the
+    serial solver would have skipped, because a figure's possible values
+    can shrink between the prefetch and its turn in the worklist.
+    """
+    def __init__(self, puzzle, checkpoint=None,
+                 interval=solve_nodes.CHECKPOINT_SECONDS, limit=FETCH_LIMIT,
+                 stamp=None):
+        solve_nodes.Propagator.__init__(self, puzzle, checkpoint, interval,
+                                        stamp)
+        self.limit = max(1, limit)
+        self.rounds = 0
+
+    def propagate(self):
+        """
+        Process the worklist one frontier at a time.
+
+        The frontier is the list of figures in the worklist when a round
+        starts.  Figures added during the round are handled in the next
+        one, which is the same order that Propagator.propagate() uses.
+        """
+        while self.worklist:
+            frontier = list(self.worklist)
+            wanted = []
+            for thisn in frontier:
+                if self.stale_arcs(thisn):
+                    wanted.extend(self.page_keys(thisn))
+            self.prefetch(wanted)
+            for _ in frontier:
+                self.process_head()
+
+    def fix_question_marks(self):
+        """
+        Prefetch the pages of the neighbors of every '?' figure, then
+        handle the '?' figures as Propagator does.
+        """
+        wanted = []
+        for indx, node in enumerate(self.nodes):
+            if node.pattern == '?':
+                for other in self.question_mark_sources(indx):
+                    wanted.extend(self.page_keys(other))
+        self.prefetch(wanted)
+        solve_nodes.Propagator.fix_question_marks(self)
+
+    def page_keys(self, indx):
+        """
+        Return the (link, is_movie, priority) pages of a figure's possible
+        values.
+        """
+        is_movie = self.nodes[indx].type == 'S'
+        size = len(self.nodes[indx].possible)
+        return [(link, is_movie, size) for link in self.nodes[indx].possible]
+
+    def prefetch(self, wanted):
+        """
+        Read the pages in wanted that are not known yet, concurrently.
+
+        The pages are requested in priority order, and the results are
+        saved in the AssocGraph in that order, not the order in which they
+        arrive.  Nothing is done when the offline imdb store is open,
+        since there is no network wait.
+        """
+        if imdb_dataset.get_store():
+            return
+        keys = []
+        seen = set()
+        for key in wanted:
+            if key[0] not in self.graph.fetched and key[0] not in seen:
+                seen.add(key[0])
+                keys.append(key)
+        if not keys:
+            return
+        keys.sort(key=lambda x: x[2])
+        self.rounds += 1
+        results = asyncio.run(self.gather(keys))
+        for key, alist in zip(keys, results):
+            self.graph.record(key[0], alist)
+
+    async def gather(self, keys):
+        """
+        Read a list of (link, is_movie, priority) pages, at most limit at a
+        time.
+
+        Returns the [name, link] lists in the order of keys.  The pages
+        are read by a pool of limit threads (asyncio.run() shuts it down).
+        """
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=self.limit))
+        limit = asyncio.Semaphore(self.limit)
+
+        async def read_one(key):
+            async with limit:
+                return await asyncio.to_thread(read_page, *key)
+        return await asyncio.gather(*[read_one(key) for key in keys])
+
+    def counters(self):
+        """
+        Add the number of concurrent rounds to the solver counters.
+        """
+        result = solve_nodes.Propagator.counters(self)
+        result['prefetch_rounds'] = self.rounds
+        return result
+
+
+def read_page(link, is_movie, rank):
+    """
+    Read one page with the given fetch_scheduler priority.  Run in a
+    worker thread.
+    """
+    with fetch_scheduler.priority(rank):
+        return assoc_graph.fetch(link, is_movie)
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+"""
+Solve many contests at once.
+
+Every directory in ../games that contains a puzzle.txt file is solved
+(or only the contests named on the command line).  Contests are solved
+in parallel by a pool of processes.  All of the processes share the
+page cache (imdb search, cast and filmography pages) and the popularity
+score cache, so pages needed by several contests are only read once.
+
+role_playing.ini supplies the settings.  A contest directory may also
+contain a contest.ini file, whose DEFAULT values (year and first_year,
+for example) override role_playing.ini for that contest.
+
+When finished, the time taken by each contest is written to
+../games/batch_summary.json.
+
+Usage:
+    python3 batch_solve.py [-j processes] [contest ...]
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import glob
+import json
+import os
+import time
+import traceback
+import start_module
+
+HOME_DIR = os.path.dirname(os.path.abspath(__file__))
+SUMMARY = os.path.join('..', 'games', 'batch_summary.json')
+
+
+def find_contests():
+    """
+    Return the names of the directories in ../games with a puzzle.txt.
+    """
+    puzzles = glob.glob(os.path.join('..', 'games', '*', 'puzzle.txt'))
+    return sorted(os.path.basename(os.path.dirname(x)) for x in puzzles)
+
+
+def solve_one(contest):
+    """
+    Solve one contest.  Run in a worker process.
+
+    Arguments:
+        contest -- directory name in ../games
+
+    Returns a summary dictionary with the contest name, its status
+    ('solved' or the error message), and the seconds spent in each step.
+    """
+    os.chdir(HOME_DIR)
+    start = time.time()
+    result = {'contest': contest}
+    try:
+        ini_files = ['role_playing.ini',
+                     os.path.join('..', 'games', contest, 'contest.ini')]
+        params = start_module.start_rtn(ini_files, contest)
+        if not params:
+            raise ValueError('unable to read settings')
+        result.update(start_module.solve_contest(params))
+        result['status'] = 'solved'
+    except Exception as errval:  # pylint: disable=W0703
+        result['status'] = 'error: %s' % errval
+        result['traceback'] = traceback.format_exc()
+    result['total'] = time.time() - start
+    return result
+
+
+def batch_solve(contests, processes):
+    """
+    Solve a list of contests in a pool of processes.
+
+    Arguments:
+        contests -- list of directory names in ../games
+        processes -- number of contests solved at the same time
+
+    Returns the list of summaries (see solve_one) in contests order.
+    """
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        results = list(pool.map(solve_one, contests))
+    summary = {'processes': processes, 'total': time.time() - start,
+               'contests': results}
+    with open(SUMMARY, 'w') as outfile:
+        json.dump(summary, outfile, indent=2)
+    return results
+
+
+def main():
+    """
+    Parse the command line and solve the contests.
+    """
+    os.chdir(HOME_DIR)
+    parser = argparse.ArgumentParser(description='Solve several contests.')
+    parser.add_argument('-j', '--processes', type=int,
+                        default=os.cpu_count() or 1,
+                        help='number of contests solved at the same time')
+    parser.add_argument('contests', nargs='*',
+                        help='contests to solve (default: all of them)')
+    args = parser.parse_args()
+    contests = args.contests or find_contests()
+    for result in batch_solve(contests, max(1, args.processes)):
+        print('%-20s %8.1f seconds  %s' % (result['contest'],
+                                           result['total'],
+                                           result['status']))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/python
+"""
+Local stand-in for the imdb and google web pages.
+
+The server builds pages from a dataset file instead of the real web
+sites, in the same html layout that find_movies, scan_exp and popularity
+parse.  It is used by benchmark.py so that performance can be measured
+without network traffic.
+
+A dataset file is a json object with these entries:
+    movies -- {"tt1": {"title": ..., "year": ..., "votes": ...}, ...}
+    people -- {"nm1": {"name": ...}, ...}
+    cast -- {"tt1": ["nm1", "nm2", ...], ...} (in billing order)
+
+Requests are counted by kind (search, credits, name, google, and
+throttled for refused requests) in StandInSite.counts.
+transport.configure(rewrites=server.rewrites()) sends the scrapers'
+requests here.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import re
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs
+
+PAGE_SIZE = 50
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Answer one request with a page built from the server's dataset.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):  # pylint: disable=C0103
+        """
+        Route a GET request to the page builder for its url.
+        """
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        site = self.server.site
+        match = re.match(r'^/+title/(tt\d+)/fullcredits', parts.path)
+        if parts.path == '/search/title':
+            kind = 'search'
+            body = site.search_page(int(query['year'][0]),
+                                    int(query.get('page', ['1'])[0]))
+        elif match:
+            kind = 'credits'
+            body = site.credits_page(match.group(1))
+        elif re.match(r'^/+name/nm\d+', parts.path):
+            kind = 'name'
+            body = site.name_page(parts.path.strip('/').split('/')[1])
+        elif parts.path == '/search':
+            kind = 'google'
+            body = site.google_page(query.get('q', [''])[0])
+        else:
+            kind = 'other'
+            body = None
+        if site.throttled():
+            site.count('throttled')
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        site.count(kind)
+        if site.latency:
+            time.sleep(site.latency)
+        if body is None:
+            self.send_error(404)
+            return
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        return
+
+
+class StandInSite:
+    """
+    Page builders for a dataset.
+
+    filler is the number of bytes of unrelated html appended to credits
+    and name pages, to mimic the size of the real pages, and latency is
+    the number of seconds each request waits before it is answered.  If
+    limit is set, requests beyond limit in one second are answered with
+    429 (too many requests), like a site that blocks fast scrapers.
+    """
+    def __init__(self, dataset, filler=0, latency=0.0, limit=0):
+        self.movies = dataset['movies']
+        self.people = dataset['people']
+        self.cast = dataset['cast']
+        self.latency = latency
+        self.limit = limit
+        self.window = [0, 0]
+        self.filler = '<p>' + 'x' * 76 + '</p>\n'
+        self.filler *= filler // len(self.filler)
+        self.films = {}
+        for movie, names in self.cast.items():
+            for name in names:
+                self.films.setdefault(name, []).append(movie)
+        self.by_year = {}
+        for movie, info in self.movies.items():
+            self.by_year.setdefault(info['year'], []).append(movie)
+        for year in self.by_year:
+            self.by_year[year].sort(
+                key=lambda x: (-self.movies[x]['votes'], x))
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def count(self, kind):
+        """
+        Count a request of one kind.
+        """
+        with self.lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def throttled(self):
+        """
+        Return True if this request is over the limit for this second.
+        """
+        if not self.limit:
+            return False
+        with self.lock:
+            now = int(time.monotonic())
+            if self.window[0] != now:
+                self.window = [now, 0]
+            self.window[1] += 1
+            return self.window[1] > self.limit
+
+    def search_page(self, year, page):
+        """
+        Return an imdb advanced search result page.
+        """
+        movies = self.by_year.get(year, [])
+        movies = movies[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+        rows = ['<div class="lister-item"><h3><a href="/title/%s/'
+                '?ref_=adv_li_tt">%s</a></h3></div>\n' %
+                (x, self.movies[x]['title']) for x in movies]
+        return '<html><body>\n%s</body></html>\n' % ''.join(rows)
+
+    def credits_page(self, movie):
+        """
+        Return an imdb full credits page, or None for an unknown movie.
+        """
+        if movie not in self.movies:
+            return None
+        rows = ['<tr class="odd"><td class="primary_photo"></td>'
+                '<td itemprop="actor"><a href="/name/%s/?ref_=ttfc_fc_cl_t%d">'
+                '<span class="itemprop" itemprop="name">%s</span></a></td>'
+                '<td class="ellipsis">...</td><td class="character">'
+                'Role %d</td></tr>\n' %
+                (x, indx + 1, self.people[x]['name'], indx + 1)
+                for indx, x in enumerate(self.cast.get(movie, []))]
+        return ('<html><body>\n<h1>%s</h1>\n<table class="cast_list">\n'
+                '%s</table>\n%s</body></html>\n' %
+                (self.movies[movie]['title'], ''.join(rows), self.filler))
+
+    def name_page(self, name):
+        """
+        Return an imdb name page, or None for an unknown person.
+        """
+        if name not in self.people:
+            return None
+        films = sorted(self.films.get(name, []),
+                       key=lambda x: (-self.movies[x]['year'], x))
+        rows = ['<div class="filmo-row odd" id="actor-%s">\n'
+                '<span class="year_column">\n%d\n</span>\n'
+                '<b><a href="/title/%s/?ref_=nm_flmg_act_%d">%s</a></b>\n'
+                '<br/>\nRole\n</div>\n' %
+                (x, self.movies[x]['year'], x, indx + 1,
+                 self.movies[x]['title'])
+                for indx, x in enumerate(films)]
+        return ('<html><body>\n<h1>%s</h1>\n<div id="filmo-head-actor">'
+                'Actor</div>\n<div class="filmo-category-section">\n%s'
+                '</div>\n<div id="filmo-head-self">Self</div>\n%s'
+                '</body></html>\n' %
+                (self.people[name]['name'], ''.join(rows), self.filler))
+
+    def google_page(self, query):
+        """
+        Return a google result page for a person or a movie.
+        """
+        words = query.split(' ')
+        if words[-1] == 'movie':
+            title = ' '.join(words[:-1])
+            votes = max([x['votes'] for x in self.movies.values()
+                         if x['title'] == title] or [0])
+            return ('<html><body><span>Box office</span>'
+                    '<span>%d.0 million USD</span></body></html>\n' %
+                    (votes // 1000))
+        hits = 0
+        for person, info in self.people.items():
+            if info['name'] == query:
+                hits += sum(self.movies[x]['votes']
+                            for x in self.films.get(person, []))
+        return ('<html><body><div>About {:,} results</div></body></html>\n'
+                .format(hits))
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Threaded http server for a StandInSite, on a free local port.
+    """
+    daemon_threads = True
+
+    def __init__(self, site):
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+        self.site = site
+        self.thread = None
+
+    def start(self):
+        """
+        Serve requests in a background thread.
+        """
+        self.thread = threading.Thread(target=self.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop serving requests.
+        """
+        self.shutdown()
+        self.server_close()
+
+    def rewrites(self):
+        """
+        Return the transport url rewrites that point at this server.
+        """
+        base = 'http://127.0.0.1:%d' % self.server_address[1]
+        return {'https://www.imdb.com': base,
+                'https://www.google.com': base}
+
+
+def load_dataset(fname):
+    """
+    Read a dataset file.
+    """
+    with open(fname, 'r') as in_file:
+        return json.load(in_file)
@@ -0,0 +1,350 @@
+#!/usr/bin/python
+"""
+Measure the speed of each step of solving a puzzle.
+
+A benchmark fixture is a directory in ../bench/fixtures containing:
+    dataset.json -- movies, people and casts served by bench_server
+    puzzle.txt -- the puzzle to solve
+    fixture.json -- year and first (year range searched), and optionally
+                    search (search mode), filler (bytes of extra html
+                    on each credits and name page) and latency (seconds
+                    before each page is sent)
+    solution.json -- the right answers (optional; made by puzzle_gen.py)
+
+The imdb and google pages are served by a local bench_server, and new
+empty page, score and entity caches are used, so every run reads the
+same pages and no network traffic is made.  find_films, link_nodes, the
+solver (with the time spent in fix_question_marks shown separately),
+generate_html, and build_html.movie_xlate and movie_layout (the script
+and compact drawing modes) are timed one at a time.  The wall time, peak
+memory (from tracemalloc) and number of requests of each kind are saved
+as json in ../bench/results, so that runs can be compared.
+If the fixture has a solution, the number of figures answered correctly
+is saved too.
+
+The solver used is solve_nodes.Propagator, or with -a the
+async_solver.AsyncPropagator.  With -p, cast lists are read while
+find_films runs (see pipeline), and the solve step starts right after it.
+With -z, search pages are read only as needed (see find_movies.discover),
+and finding movies, link_nodes and solving are timed together as one
+discover step.
+With -w, the puzzle is solved once to fill the page, score and entity
+caches, and the second run is timed.  With -s, the render-only path
+(redrawing a puzzle whose answers.json exists) is timed in that many new
+python processes (see time_rerun).
+
+Usage:
+    python3 benchmark.py [-a] [-p] [-z] [-w] [-s runs] [-l latency]
+                         [-r rate] [-t throttle] [-c old_result.json]
+                         [fixture]
+"""
+import argparse
+from datetime import datetime
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import async_solver
+import bench_server
+import build_html
+import entity_store
+import fetch_scheduler
+import find_movies
+import link_nodes
+import page_cache
+import pipeline
+import popularity
+import solve_nodes
+import start_module
+import transport
+
+HOME_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join('..', 'bench', 'fixtures')
+RESULTS = os.path.join('..', 'bench', 'results')
+RERUN = """import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import start_module
+start_module.solve_contest(json.loads(sys.argv[2]))
+print(time.perf_counter() - start)
+"""
+
+
+class Phase:
+    """
+    Measure one step: wall time, peak memory and requests made.
+
+    Used as a context manager.  The measurements are saved in result.
+    """
+    def __init__(self, site):
+        self.site = site
+        self.result = {}
+        self.start = 0
+        self.counts = {}
+
+    def __enter__(self):
+        self.counts = dict(self.site.counts)
+        tracemalloc.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.result['seconds'] = time.perf_counter() - self.start
+        self.result['peak_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+        requests = {}
+        for kind, count in self.site.counts.items():
+            if count != self.counts.get(kind, 0):
+                requests[kind] = count - self.counts.get(kind, 0)
+        self.result['requests'] = requests
+
+
+def run_fixture(fixture, work_dir, use_async=False, latency=None, rate=0,
+                limit=0, overlap=False, lazy=False):
+    """
+    Solve the puzzle of one fixture, measuring each step.
+
+    Arguments:
+        fixture -- directory of the fixture
+        work_dir -- empty directory for the caches and the output files
+        use_async -- solve with async_solver.AsyncPropagator
+        latency -- seconds before each page is sent (overrides the
+                   fixture's latency)
+        rate -- starting fetch_scheduler rate (0 for no pacing)
+        limit -- requests per second the server answers before sending
+                 429 responses (0 for no limit)
+        overlap -- read cast lists during find_films (see pipeline)
+        lazy -- read search pages only as needed (see find_movies.discover)
+
+    Returns a dictionary of measurements (see Phase) indexed by step.
+    """
+    with open(os.path.join(fixture, 'fixture.json'), 'r') as in_file:
+        settings = json.load(in_file)
+    site = bench_server.StandInSite(
+        bench_server.load_dataset(os.path.join(fixture, 'dataset.json')),
+        settings.get('filler', 0),
+        settings.get('latency', 0.0) if latency is None else latency, limit)
+    server = bench_server.StandInServer(site)
+    server.start()
+    page_cache.configure(path=os.path.join(work_dir, 'pages.db'))
+    popularity.configure(path=os.path.join(work_dir, 'scores.db'))
+    entity_store.configure(path=os.path.join(work_dir, 'entities.db'))
+    transport.configure(rewrites=server.rewrites())
+    fetch_scheduler.configure(rate=rate)
+    ploc = os.path.join(work_dir, 'puzzle.txt')
+    shutil.copy(os.path.join(fixture, 'puzzle.txt'), ploc)
+    params = {'contest': os.path.basename(fixture), 'verbose': False,
+              'year': settings['year'], 'first': settings['first'],
+              'workers': settings.get('workers', 1)}
+    phases = {}
+    prefetcher = pipeline.CreditsPrefetcher() if overlap else None
+    on_update = prefetcher.update if prefetcher else None
+    fixing = {'seconds': 0.0, 'calls': 0}
+    solvers = []
+
+    def make_solver(puzzle):
+        if use_async:
+            solver = async_solver.AsyncPropagator(puzzle)
+        else:
+            solver = solve_nodes.Propagator(puzzle)
+        fix_question_marks = solver.fix_question_marks
+
+        def timed_fix():
+            start = time.perf_counter()
+            fix_question_marks()
+            fixing['seconds'] += time.perf_counter() - start
+            fixing['calls'] += 1
+        solver.fix_question_marks = timed_fix
+        solvers.append(solver)
+        return solver
+
+    def solve(info, _pages):
+        puzzle = link_nodes.link_nodes(ploc, info, False)
+        return make_solver(puzzle).run(settings.get('search', 'all'))
+    try:
+        if lazy:
+            with Phase(site) as phase:
+                answers = find_movies.discover(ploc, params, solve, None,
+                                               on_update)[1]
+            phases['discover'] = phase.result
+            phases['discover']['solves'] = len(solvers)
+            step = 'discover'
+        else:
+            with Phase(site) as phase:
+                info = find_movies.find_films(ploc, params, None, on_update)
+            phases['find_films'] = phase.result
+            with Phase(site) as phase:
+                puzzle = link_nodes.link_nodes(ploc, info, False)
+            phases['link_nodes'] = phase.result
+            solver = make_solver(puzzle)
+            with Phase(site) as phase:
+                answers = solver.run(settings.get('search', 'all'))
+            phases['solve'] = phase.result
+            step = 'solve'
+        with open(os.path.join(work_dir, 'answers.json'), 'w') as outfile:
+            json.dump(answers, outfile)
+        phases[step]['fix_question_marks'] = fixing
+        phases[step]['revisions'] = sum(x.revisions for x in solvers)
+        phases[step]['fetches'] = sum(x.graph.fetches for x in solvers)
+        if prefetcher:
+            prefetcher.close()
+            prefetcher = None
+        with Phase(site) as phase:
+            start_module.generate_html(ploc, answers, work_dir)
+        phases['generate_html'] = phase.result
+        with Phase(site) as phase:
+            build_html.movie_xlate(os.path.join(work_dir, 'solution.txt'))
+        phases['movie_xlate'] = phase.result
+        with Phase(site) as phase:
+            build_html.movie_layout(os.path.join(work_dir, 'solution.txt'))
+        phases['movie_layout'] = phase.result
+    finally:
+        if prefetcher:
+            prefetcher.close()
+        transport.configure(rewrites={})
+        server.stop()
+    phases['total_requests'] = dict(site.counts)
+    solution = os.path.join(fixture, 'solution.json')
+    if os.path.isfile(solution):
+        with open(solution, 'r') as in_file:
+            right = json.load(in_file)
+        with open(os.path.join(work_dir, 'solution.txt'), 'r') as in_file:
+            found = dict(x.split('|')[1:3] for x in in_file.read().split('\n')
+                         if x)
+        phases['correct'] = {'figures': len(right), 'correct': len(
+            [x for x in right if found.get(x) == right[x][0]])}
+    return phases
+
+
+def time_rerun(work_dir, runs):
+    """
+    Time the render-only path of start_module in new python processes.
+
+    A contest directory (with a copy of ../data) is made from the
+    puzzle.txt and answers.json left in work_dir by run_fixture, and
+    start_module.solve_contest is run on it runs times, the way an
+    archived puzzle is redrawn.  The scores of figures with several
+    answers come from the score cache of that run.
+
+    Returns the average seconds of a whole run ('wall'), of the part
+    after python has started ('in_process'), and of starting python and
+    doing nothing ('python').
+    """
+    root = os.path.join(work_dir, 'rerun')
+    gpath = os.path.join(root, 'games', 'bench')
+    os.makedirs(gpath)
+    os.makedirs(os.path.join(root, 'role_playing'))
+    shutil.copytree(os.path.join('..', 'data'), os.path.join(root, 'data'))
+    for fname in ('puzzle.txt', 'answers.json'):
+        shutil.copy(os.path.join(work_dir, fname), gpath)
+    params = {'contest': 'bench', 'verbose': False, 'modules': {
+        'popularity': {'path': os.path.join(work_dir, 'scores.db')}}}
+    command = [sys.executable, '-c', RERUN, HOME_DIR, json.dumps(params)]
+    result = {'runs': runs, 'wall': 0.0, 'in_process': 0.0, 'python': 0.0}
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run(command,
+                                cwd=os.path.join(root, 'role_playing'),
+                                check=True, stdout=subprocess.PIPE,
+                                universal_newlines=True).stdout
+        result['wall'] += time.perf_counter() - start
+        result['in_process'] += float(output.split()[-1])
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        result['python'] += time.perf_counter() - start
+    for key in ('wall', 'in_process', 'python'):
+        result[key] /= runs
+    return result
+
+
+def compare(old, new):
+    """
+    Print the times of two benchmark results side by side.
+    """
+    print('%-16s %10s %10s %8s' % ('step', 'old', 'new', 'ratio'))
+    for step, values in new['phases'].items():
+        if 'seconds' not in values or step not in old['phases']:
+            continue
+        before = old['phases'][step]['seconds']
+        after = values['seconds']
+        print('%-16s %10.4f %10.4f %8.2f' % (step, before, after,
+                                              after / before if before
+                                              else 0.0))
+
+
+def main():
+    """
+    Parse the command line, run the benchmark and save the results.
+    """
+    os.chdir(HOME_DIR)
+    parser = argparse.ArgumentParser(description='Time the puzzle solver.')
+    parser.add_argument('-c', '--compare',
+                        help='earlier result file to compare against')
+    parser.add_argument('-a', '--use-async', action='store_true',
+                        help='use the async solver')
+    parser.add_argument('-p', '--pipeline', action='store_true',
+                        help='read cast lists during the movie search')
+    parser.add_argument('-z', '--lazy', action='store_true',
+                        help='read search pages only as needed')
+    parser.add_argument('-w', '--warm', action='store_true',
+                        help='solve once to fill the caches, then time a '
+                        'second run')
+    parser.add_argument('-s', '--startup', type=int, default=0,
+                        help='time this many render-only reruns')
+    parser.add_argument('-l', '--latency', type=float,
+                        help='seconds before each page is sent')
+    parser.add_argument('-r', '--rate', type=float, default=0,
+                        help='starting requests per second (default: '
+                        'no pacing)')
+    parser.add_argument('-t', '--throttle', type=int, default=0,
+                        help='requests per second the server allows')
+    parser.add_argument('fixture', nargs='?', default='small',
+                        help='fixture in ../bench/fixtures (default: small)')
+    args = parser.parse_args()
+    work_dir = tempfile.mkdtemp(prefix='bench-')
+    try:
+        for _ in range(2 if args.warm else 1):
+            phases = run_fixture(os.path.join(FIXTURES, args.fixture),
+                                 work_dir, args.use_async, args.latency,
+                                 args.rate, args.throttle, args.pipeline,
+                                 args.lazy)
+        if args.startup:
+            phases['rerun'] = time_rerun(work_dir, args.startup)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    result = {'fixture': args.fixture, 'time': stamp,
+              'solver': 'async' if args.use_async else 'serial',
+              'pipeline': args.pipeline, 'lazy': args.lazy,
+              'warm': args.warm,
+              'phases': phases}
+    if not os.path.isdir(RESULTS):
+        os.makedirs(RESULTS)
+    out_name = os.path.join(RESULTS, '%s-%s.json' % (args.fixture, stamp))
+    with open(out_name, 'w') as outfile:
+        json.dump(result, outfile, indent=2)
+    for step, values in phases.items():
+        if 'seconds' in values:
+            print('%-16s %10.4f seconds %8d KB  %s' % (
+                step, values['seconds'], values['peak_kb'],
+                values['requests']))
+    if 'rerun' in phases:
+        print('render-only rerun: %.4f seconds (%.4f after python started, '
+              '%.4f to start python)' % (phases['rerun']['wall'],
+                                          phases['rerun']['in_process'],
+                                          phases['rerun']['python']))
+    if 'correct' in phases:
+        print('%d of %d figures correct' % (phases['correct']['correct'],
+                                            phases['correct']['figures']))
+    print('saved in %s' % out_name)
+    if args.compare:
+        with open(args.compare, 'r') as in_file:
+            compare(json.load(in_file), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,22 +3,32 @@
 Generate an html file drawing of the layout.
 
 The user supplied information is in ../games
-Html pieces (toppart.txt and botpart.txt) are stored in ../data
+Html pieces (toppart.txt, drawloop.txt and botpart.txt) are stored in
+../data
+
+There are two ways of drawing the layout.  In script mode, javascript
+statements are written for every line, figure and word.  In compact mode,
+the layout is written once as a json object, and a fixed loop
+(drawloop.txt) draws it.  Compact mode makes much smaller html files for
+large puzzles.
 """
+import json
 import os
 
 
-def generate_html(location, info_file):
+def generate_html(location, info_file, mode='script'):
     """
-    Wrap text returned from movie_xlate with html code.
+    Wrap text returned from movie_xlate (or movie_layout) with html code.
 
     Arguments:
         location: directory/folder in ../games where this puzzle's
                   information is stored
         info_file: text_file containing layout information
+        mode: 'script' or 'compact' (see above)
 
     Creates ../games/solution.html based on information in info_file.
-    Uses ../games/toppart.txt and ../games/botpart.txt
+    Uses ../data/toppart.txt and ../data/botpart.txt (and
+    ../data/drawloop.txt in compact mode)
     """
     toppart = os.path.join('..', 'data', 'toppart.txt')
     botpart = os.path.join('..', 'data', 'botpart.txt')
@@ -26,16 +36,15 @@ def generate_html(location, info_file):
     outputf = os.path.join('..', 'games', location, 'solution.html')
     with open(toppart, 'r+') as in_file:
         txt = in_file.read()
-    movie_txt, data_x, data_y, pt_size = movie_xlate(intext)
-    txt = txt % (data_x, data_y, pt_size)
-    with open(outputf, 'w') as out_file:
-        out_file.write(txt)
-    with open(outputf, 'a+') as out_file:
-        out_file.write(movie_txt)
+    if mode == 'compact':
+        movie_txt, data_x, data_y, pt_size = movie_layout(intext)
+    else:
+        movie_txt, data_x, data_y, pt_size = movie_xlate(intext)
     with open(botpart, 'r+') as in_file:
-        txt = in_file.read()
-    with open(outputf, 'a+') as out_file:
-        out_file.write(txt)
+        bottom = in_file.read()
+    with open(outputf, 'w') as out_file:
+        out_file.write(''.join([txt % (data_x, data_y, pt_size), movie_txt,
+                                bottom]))
 
 
 def measurements(std_size):
@@ -97,6 +106,49 @@ def movie_xlate(in_text):
             size_data['point_size'])
 
 
+def movie_layout(in_text):
+    """
+    Return the compact mode html of the data in a solution.
+
+    Arguments:
+        in_text: text file containing layout information in movie puzzle format
+
+    returns:
+       The same values as movie_xlate.  The html is a json layout object
+       followed by the draw loop in ../data/drawloop.txt.  In the layout,
+       lines is a flat list of grid coordinates (x1, y1, x2, y2 for each
+       line), and figures is a list of [C or S, x, y, text] entries.
+    """
+    with open(in_text, 'r+') as in_file:
+        figures = in_file.read().split('\n')
+    size_data = measurements(200)
+    lines = []
+    afigs = []
+    max_x = 0
+    max_y = 0
+    for figure in figures:
+        if not figure:
+            continue
+        oparts = figure.split('|')
+        xval, yval = [int(x) for x in oparts[1].split(',')]
+        max_x = max(max_x, xval)
+        max_y = max(max_y, yval)
+        afigs.append([oparts[0][-1], xval, yval, oparts[2]])
+        for segment in oparts[3].split(':'):
+            if segment:
+                lines.extend([xval, yval] +
+                             [int(x) for x in segment.split(',')])
+    layout = json.dumps({'sizes': size_data, 'lines': lines,
+                         'figures': afigs}, separators=(',', ':'))
+    with open(os.path.join('..', 'data', 'drawloop.txt'), 'r') as in_file:
+        loop = in_file.read()
+    ostring = ''.join(['      var layout = ', layout.replace('</', '<\\/'),
+                       ';\n', loop])
+    return (ostring, (max_x + 1) * size_data['std_size_loc'],
+            (max_y + 1) * size_data['std_size_loc'],
+            size_data['point_size'])
+
+
 def get_figure_info(figures, size_data):
     """
     Parse movie data and make calls to draw line segments.
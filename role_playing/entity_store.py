@@ -0,0 +1,150 @@
+#!/usr/bin/python
+"""
+Persistent store of parsed cast lists and filmographies.
+
+The page cache saves the html of every imdb page read, but each run
+still has to parse megabytes of it with the HTMLParser classes in
+scan_exp.  This store keeps what those parsers return instead: the
+[name, link] list of a movie's cast or an actor's movies, indexed by the
+imdb link of the movie or actor.  A warm run reads a few hundred bytes
+per entity, with no request and no parsing.
+
+Each list is saved as one compressed record (see encode()) in an SQLite
+file next to the page cache.  The store is emptied when the version of
+the parsers that made its records (scan_exp.PARSER_VERSION) changes, so
+a parser fix is never hidden by old results.
+"""
+import os
+import sqlite3
+import threading
+import time
+import zlib
+import metrics
+
+STORE_FILE = os.path.join('..', 'cache', 'entities.db')
+TTL = 30 * 24 * 60 * 60
+FORMAT = 1
+FIELD = '\x1f'
+RECORD = '\x1e'
+
+
+def encode(alist):
+    """
+    Pack a [name, link] list into bytes.
+
+    The first byte is the record format (FORMAT).  The rest is the
+    zlib compressed text of the list, with the name and link of each
+    entry separated by FIELD, and the entries separated by RECORD.
+    """
+    text = RECORD.join(FIELD.join(entry) for entry in alist)
+    return bytes([FORMAT]) + zlib.compress(text.encode('utf-8'))
+
+
+def decode(body):
+    """
+    Unpack bytes made by encode().  Returns None if the record has some
+    other format.
+    """
+    if not body or body[0] != FORMAT:
+        return None
+    text = zlib.decompress(body[1:]).decode('utf-8')
+    if not text:
+        return []
+    return [entry.split(FIELD) for entry in text.split(RECORD)]
+
+
+class EntityStore:
+    """
+    Link indexed store of parsed lists kept in an SQLite file.
+
+    kind separates the lists from each page type ('cast' or 'films').
+    Each row also holds the time that it was saved; rows older than ttl
+    are not used.  The meta table holds the parser version of the rows.
+    """
+    def __init__(self, path, version, ttl=TTL):
+        dname = os.path.dirname(path)
+        if dname and not os.path.isdir(dname):
+            os.makedirs(dname)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60,
+                                    check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS entities ('
+                          'kind TEXT, link TEXT, body BLOB, saved REAL, '
+                          'PRIMARY KEY (kind, link))')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta ('
+                          'key TEXT PRIMARY KEY, value TEXT)')
+        row = self.conn.execute("SELECT value FROM meta WHERE "
+                                "key = 'parser_version'").fetchone()
+        if row is None or row[0] != str(version):
+            self.conn.execute('DELETE FROM entities')
+            self.conn.execute('INSERT OR REPLACE INTO meta VALUES '
+                              "('parser_version', ?)", (str(version),))
+        self.conn.commit()
+
+    def get(self, kind, link):
+        """
+        Return the saved list of an entity, or None if it is not usable.
+
+        Arguments:
+            kind -- 'cast' or 'films'
+            link -- imdb link of the movie or actor
+        """
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT body, saved FROM entities WHERE kind = ? AND '
+                'link = ?', (kind, link)).fetchone()
+        alist = None
+        if row is not None and time.time() - row[1] <= self.ttl:
+            alist = decode(row[0])
+        metrics.count_cache('entities', alist is not None)
+        return alist
+
+    def put(self, kind, link, alist):
+        """
+        Save the parsed list of an entity.
+
+        Arguments:
+            kind -- 'cast' or 'films'
+            link -- imdb link of the movie or actor
+            alist -- list of [name, link] entries
+        """
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO entities '
+                              'VALUES (?, ?, ?, ?)',
+                              (kind, link, encode(alist), time.time()))
+            self.conn.commit()
+
+
+_STORE = {'path': STORE_FILE, 'ttl': TTL, 'store': None}
+
+
+def configure(path=None, ttl=None):
+    """
+    Change the location or time to live of the shared entity store.
+
+    Arguments:
+        path -- file name of the SQLite database, or '' to turn the
+                store off
+        ttl -- seconds that a saved list stays valid
+    """
+    if path is not None:
+        _STORE['path'] = path
+    if ttl is not None:
+        _STORE['ttl'] = ttl
+    _STORE['store'] = None
+
+
+def get_store(version):
+    """
+    Return the shared EntityStore, opening it on first use, or None if
+    the store is turned off.
+
+    Arguments:
+        version -- version of the parsers whose results are saved
+    """
+    if not _STORE['path']:
+        return None
+    if _STORE['store'] is None:
+        _STORE['store'] = EntityStore(_STORE['path'], version, _STORE['ttl'])
+    return _STORE['store']
@@ -0,0 +1,208 @@
+#!/usr/bin/python
+"""
+Pacing, ordering and sharing of web page requests.
+
+transport.get() asks this module for permission before every request
+and reports how each request went.  Requests are paced per host by a
+token bucket whose rate adapts to the site (AIMD): it grows slowly while
+pages come back quickly, is cut when pages slow down, and is halved (and
+the host paused for any Retry-After time) when the site answers 429 or
+503.  This keeps the request rate close to the highest rate that a site
+accepts without getting blocked in the middle of a solve.
+
+When several requests wait for the same host, the one with the lowest
+priority number goes first.  The priority of the current thread or task
+is set with priority(); the solvers use the number of possible values of
+the figure being checked, so the most constrained figures are served
+first.
+
+single_flight() lets callers asking for the same page at the same time
+share one request (see page_cache).
+"""
+from contextlib import contextmanager
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from urllib.parse import urlsplit
+
+RATE = 10.0
+BURST = 10
+MIN_RATE = 0.5
+MAX_RATE = 50.0
+INCREASE = 0.5
+DECREASE = 0.8
+SLOW = 3.0
+THROTTLE_CODES = (429, 503)
+DEFAULT_PRIORITY = 100
+
+_PRIORITY = contextvars.ContextVar('fetch_priority',
+                                   default=DEFAULT_PRIORITY)
+
+
+class HostLimiter:
+    """
+    Adaptive token bucket for one host.
+
+    rate is in requests per second, and up to burst requests can be made
+    at once after a quiet period.  Waiting requests are kept in a heap
+    ordered by (priority, arrival), and only the first one may take a
+    token.
+    """
+    def __init__(self, rate=RATE, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.latency = None
+        self.waiting = []
+        self.order = itertools.count()
+        self.cond = threading.Condition()
+
+    def refill(self, now):
+        """
+        Add the tokens earned since the last refill.  Called with the
+        lock held.
+        """
+        self.tokens = min(float(self.burst),
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority):
+        """
+        Wait until this request may be sent.
+        """
+        with self.cond:
+            entry = (priority, next(self.order))
+            heapq.heappush(self.waiting, entry)
+            while True:
+                now = time.monotonic()
+                self.refill(now)
+                delay = None
+                if self.waiting[0] == entry:
+                    if now < self.paused_until:
+                        delay = self.paused_until - now
+                    elif self.tokens >= 1.0:
+                        self.tokens -= 1.0
+                        heapq.heappop(self.waiting)
+                        self.cond.notify_all()
+                        return
+                    else:
+                        delay = (1.0 - self.tokens) / self.rate
+                self.cond.wait(delay)
+
+    def feedback(self, status, latency=None, retry_after=None):
+        """
+        Adjust the rate after a response.
+
+        Arguments:
+            status -- http status code
+            latency -- seconds taken by the request (if known)
+            retry_after -- seconds the site asked us to wait (if any)
+        """
+        with self.cond:
+            if status in THROTTLE_CODES:
+                self.rate = max(MIN_RATE, self.rate / 2)
+                self.tokens = min(self.tokens, 0.0)
+                pause = retry_after if retry_after else 1.0 / self.rate
+                self.paused_until = max(self.paused_until,
+                                        time.monotonic() + pause)
+            elif latency is not None:
+                if self.latency is not None and \
+                        latency > SLOW * self.latency:
+                    self.rate = max(MIN_RATE, self.rate * DECREASE)
+                else:
+                    self.rate = min(MAX_RATE, self.rate + INCREASE)
+                if self.latency is None:
+                    self.latency = latency
+                else:
+                    self.latency = 0.8 * self.latency + 0.2 * latency
+            self.cond.notify_all()
+
+
+_HOSTS = {'rate': RATE, 'limiters': {}, 'inflight': {},
+          'lock': threading.Lock()}
+
+
+def configure(rate=None):
+    """
+    Set the starting rate (requests per second per host).  A rate of 0
+    turns pacing off.
+    """
+    with _HOSTS['lock']:
+        if rate is not None:
+            _HOSTS['rate'] = rate
+        _HOSTS['limiters'] = {}
+
+
+def get_limiter(url):
+    """
+    Return the HostLimiter of the host of url, or None if pacing is off.
+    """
+    host = urlsplit(url).netloc
+    with _HOSTS['lock']:
+        if not _HOSTS['rate']:
+            return None
+        if host not in _HOSTS['limiters']:
+            _HOSTS['limiters'][host] = HostLimiter(_HOSTS['rate'])
+        return _HOSTS['limiters'][host]
+
+
+def acquire(url):
+    """
+    Wait until a request for url may be sent, in priority order.
+    """
+    limiter = get_limiter(url)
+    if limiter is not None:
+        limiter.acquire(_PRIORITY.get())
+
+
+def feedback(url, status, latency=None, retry_after=None):
+    """
+    Report the result of a request for url (see HostLimiter.feedback).
+    """
+    limiter = get_limiter(url)
+    if limiter is not None:
+        limiter.feedback(status, latency, retry_after)
+
+
+@contextmanager
+def priority(value):
+    """
+    Set the priority of the requests made in a with block.  Lower
+    numbers go first.
+    """
+    token = _PRIORITY.set(value)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+@contextmanager
+def single_flight(key):
+    """
+    Share one request among callers that want the same page.
+
+    The first caller for key gets True and makes the request.  Callers
+    that arrive while it is running wait until it finishes and then get
+    False; they should then look for the page in the cache.
+    """
+    with _HOSTS['lock']:
+        event = _HOSTS['inflight'].get(key)
+        leader = event is None
+        if leader:
+            event = threading.Event()
+            _HOSTS['inflight'][key] = event
+    if not leader:
+        event.wait()
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        with _HOSTS['lock']:
+            del _HOSTS['inflight'][key]
+        event.set()
@@ -6,10 +6,20 @@ Loop through the TOPNMOVIES for each year in the range.  Extract
 that data into a dictionary where each entry matches a pattern
 of possible movie titles. This list of patterns matches possible
 title patterns in the puzzle.
+
+discover() instead reads the most popular page of each year first, and
+only reads more pages while the solver is left with figures that have no
+possible answers.
 """
+from concurrent.futures import ThreadPoolExecutor
 from html.parser import HTMLParser
+import json
+import os
 import re
-import requests
+import threading
+import imdb_dataset
+import page_cache
+import word_index
 
 PAGE = "https://www.imdb.com/search/title?year=%d&title_type" + \
        "=feature&page=%d&ref_=adv_nxt"
@@ -48,14 +58,17 @@ def get_sample_of_movies(year, page):
     """
     Return a dictionary of movie titles indexed by imdb link.
 
+    Search pages are kept in the shared page cache, so contests with
+    overlapping years (or several contests solved at once by batch_solve)
+    read each page only once.
+
     Arguments:
        year -- year of this search
        page -- page number of top movies for that year.
     """
     page1 = PAGE % (year, page)
-    ndata = requests.get(page1)
     parser = MoviesParse()
-    parser.feed(ndata.text)
+    parser.feed(page_cache.get_page(page1))
     return parser.result
 
 
@@ -85,7 +98,12 @@ def collect_data(year, page):
     Arguments:
         year -- year number
         page -- imdb page for top n pages
+
+    When an offline imdb store is open, the data comes from there.
     """
+    store = imdb_dataset.get_store()
+    if store:
+        return store.top_movies(year, page)
     table = get_sample_of_movies(year, page)
     return massage_data(table)
 
@@ -126,17 +144,111 @@ def conv_to_indx(movie):
 
     Returns a text representation of the word lengths.
     """
-    numbs = [str(len(i)) for i in movie.split(' ')]
-    return ','.join(numbs)
+    return word_index.pattern_string(word_index.word_lengths(movie))
+
+
+def read_journal(journal):
+    """
+    Read the crawl results saved by an earlier, unfinished run.
+
+    Each line of the journal is a json object with the year, page and
+    movies found.  A partly written last line (from a run that died while
+    writing it) is ignored.
+
+    Arguments:
+        journal -- file name of the journal
+
+    Returns a dictionary of collect_data results indexed by (year, page).
+    """
+    done = {}
+    if not journal or not os.path.isfile(journal):
+        return done
+    with open(journal, 'r') as in_file:
+        for line in in_file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            done[(entry['year'], entry['page'])] = entry['movies']
+    return done
+
+
+def crawl_pages(pairs, workers, verbose, journal=None, on_result=None):
+    """
+    Collect the movie data for a list of (year, page) pairs.
+
+    When workers is more than one, the pages are fetched in parallel
+    by a pool of threads.  The results are always returned in the same
+    order as pairs so that the merged data does not depend on which
+    fetch finished first.
+
+    If journal is given, every page is appended to it as soon as it has
+    been read, and pages already in it are not read again.  This lets a
+    crawl that was interrupted pick up where it left off.
+
+    If on_result is given, it is called with each result as soon as that
+    result and all of the ones before it are known, so callers can start
+    using the data before the crawl is over.
+
+    Arguments:
+        pairs -- list of (year, page) tuples
+        workers -- number of pages fetched at the same time
+        verbose -- display progress messages if true
+        journal -- file name of the crawl journal (optional)
+        on_result -- function called with each result, in order (optional)
+
+    Returns a list of collect_data results, one per pair.
+    """
+    done = read_journal(journal)
+    lock = threading.Lock()
+
+    def crawl_one(pair):
+        if pair in done:
+            return done[pair]
+        if verbose:
+            endm = pair[1] * 50
+            strtm = endm - 49
+            print("find movies %d through %d for %d" %
+                  (strtm, endm, pair[0]))
+        movies = collect_data(pair[0], pair[1])
+        if journal:
+            line = json.dumps({'year': pair[0], 'page': pair[1],
+                               'movies': movies})
+            with lock:
+                with open(journal, 'a') as out_file:
+                    out_file.write(line + '\n')
+        return movies
+    results = []
+    if workers <= 1:
+        for pair in pairs:
+            results.append(crawl_one(pair))
+            if on_result:
+                on_result(results[-1])
+        return results
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for movies in pool.map(crawl_one, pairs):
+            results.append(movies)
+            if on_result:
+                on_result(movies)
+    return results
 
 
-def find_films(ploc, start_info):
+def find_films(ploc, start_info, journal=None, on_update=None, pages=None):
     """
     Find all possible movies for this puzzle.
 
     Arguments:
         ploc -- text of the puzzle.
-        start_info -- dictionary of ranges for the puzzle.
+        start_info -- dictionary of ranges for the puzzle.  If it has a
+                      workers entry greater than one, pages are crawled
+                      concurrently.
+        journal -- file name of a crawl journal used to resume an
+                   interrupted crawl (optional).
+        on_update -- function called with the dictionary found so far
+                     each time a page has been added to it (optional).
+                     See pipeline.CreditsPrefetcher.
+        pages -- number of search pages read for each year (defaults to
+                 all of TOPNMOVIES).
 
     Returns:
         dictionary indexed by movie letter pattern.  Each entry
@@ -147,15 +259,82 @@ def find_films(ploc, start_info):
     keys = extract_movie_sizes(ploc)
     for key in keys:
         mdict[key] = []
-    for level in range(1, (TOPNMOVIES // 50)+1):
-        for yrv in range(start_info['year'], start_info['first'] - 1, -1):
-            if start_info['verbose'] == 1:
-                endm = level * 50
-                strtm = endm - 49
-                print("find movies %d through %d for %d" % (strtm, endm, yrv))
-            movies = collect_data(yrv, level)
-            for movie in movies:
-                mindx = conv_to_indx(movie)
-                if mindx in keys:
-                    mdict[mindx].append([movie, movies[movie]])
+    if pages is None:
+        pages = TOPNMOVIES // 50
+    deepen(mdict, start_info, range(1, pages + 1), journal, on_update)
     return mdict
+
+
+def deepen(mdict, start_info, levels, journal=None, on_update=None):
+    """
+    Add the movies on more search pages to the results of find_films.
+
+    Arguments:
+        mdict -- dictionary returned by find_films (changed in place)
+        start_info -- dictionary of ranges for the puzzle
+        levels -- page numbers to read for each year
+        journal -- file name of the crawl journal (optional)
+        on_update -- see find_films (optional)
+
+    The pages are merged in the same order as find_films uses, so reading
+    the pages one level at a time gives the same dictionary as reading
+    them all at once.
+    """
+    pairs = []
+    for level in levels:
+        for yrv in range(start_info['year'], start_info['first'] - 1, -1):
+            pairs.append((yrv, level))
+    wanted = [(word_index.parse_pattern(key), key) for key in mdict]
+
+    def add_page(movies):
+        index = word_index.build_index(movies.items())
+        for pattern, key in wanted:
+            for movie in index.get(pattern, []):
+                mdict[key].append([movie[0], movie[1]])
+        if on_update:
+            on_update(mdict)
+    crawl_pages(pairs, start_info.get('workers', 1),
+                start_info['verbose'] == 1, journal, add_page)
+
+
+def discover(ploc, start_info, solve, journal=None, on_update=None):
+    """
+    Find movies a search page at a time, solving after each one.
+
+    Most puzzles use well known movies, which are on the first search
+    page of their year.  So only that page is read at first, and another
+    page of every year is read while some title pattern has no movies at
+    all.  The puzzle is then solved, and while some figures are left with
+    no possible answers (a movie that is further down the list is
+    missing), the next page of every year is read and the puzzle is
+    solved again, until all TOPNMOVIES have been read.
+
+    A less popular movie that fits the same pattern and neighbors as a
+    missing one can be picked instead of it, so the answers can differ
+    from those found after reading every page.
+
+    Arguments:
+        ploc -- text of the puzzle.
+        start_info -- dictionary of ranges for the puzzle.
+        solve -- function called with the movies found so far and the
+                 number of search pages read for each year, returning the
+                 answers (a dictionary of lists indexed by figure).
+        journal -- file name of the crawl journal (optional).
+        on_update -- see find_films (optional).
+
+    Returns the movie dictionary (see find_films) and the answers.
+    """
+    levels = TOPNMOVIES // 50
+    level = 1
+    mdict = find_films(ploc, start_info, journal, on_update, level)
+    while level < levels and not all(mdict.values()):
+        level += 1
+        deepen(mdict, start_info, [level], journal, on_update)
+    answers = solve(mdict, level)
+    while level < levels and not all(answers.values()):
+        level += 1
+        if start_info['verbose']:
+            print("some figures have no answers, reading page %d" % level)
+        deepen(mdict, start_info, [level], journal, on_update)
+        answers = solve(mdict, level)
+    return mdict, answers
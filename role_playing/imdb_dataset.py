@@ -0,0 +1,255 @@
+#!/usr/bin/python
+"""
+Offline imdb data source.
+
+Imdb publishes its core data as gzipped tsv files (see
+https://datasets.imdbws.com).  This module reads title.basics,
+title.ratings, title.principals and name.basics a line at a time and
+saves the parts that this package uses into an indexed SQLite file.
+
+When a store is opened, find_movies, scan_exp and popularity answer
+their questions from it instead of scraping web pages.  Results are
+returned in the same form as the html parsers produce (titles and names
+with the same punctuation removed, and links such as 'title/tt0111161'
+and 'name/nm0000151').
+
+To build the store, run:
+    python3 imdb_dataset.py <directory containing the .tsv.gz files>
+"""
+import gzip
+import os
+import re
+import sqlite3
+import sys
+
+DATASET_FILE = os.path.join('..', 'cache', 'imdb.db')
+BATCH = 10000
+PAGE_SIZE = 50
+DATASET_FILES = ['title.basics.tsv.gz', 'title.ratings.tsv.gz',
+                 'title.principals.tsv.gz', 'name.basics.tsv.gz']
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS titles (tconst TEXT PRIMARY KEY, '
+    'title TEXT, plain TEXT, year INTEGER, votes INTEGER DEFAULT 0)',
+    'CREATE TABLE IF NOT EXISTS names (nconst TEXT PRIMARY KEY, '
+    'name TEXT, plain TEXT)',
+    'CREATE TABLE IF NOT EXISTS principals (tconst TEXT, '
+    'ordering INTEGER, nconst TEXT)',
+]
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS titles_year ON titles(year, votes)',
+    'CREATE INDEX IF NOT EXISTS titles_plain ON titles(plain)',
+    'CREATE INDEX IF NOT EXISTS names_plain ON names(plain)',
+    'CREATE INDEX IF NOT EXISTS principals_t ON principals(tconst)',
+    'CREATE INDEX IF NOT EXISTS principals_n ON principals(nconst)',
+]
+
+
+def plain_title(title):
+    """
+    Strip punctuation from a movie title the same way that the html
+    parsers do.
+    """
+    return re.sub("[-:,'!/?]", '', title)
+
+
+def plain_name(name):
+    """
+    Strip punctuation from a person's name the same way that the html
+    parsers do.
+    """
+    return re.sub("[']", '', name)
+
+
+def read_tsv(fname):
+    """
+    Generate the rows of a gzipped tsv file, one line at a time.
+
+    The header line is skipped.  Each row is returned as a list of
+    fields.  Imdb uses \\N for missing values.
+    """
+    with gzip.open(fname, 'rt', encoding='utf-8') as in_file:
+        in_file.readline()
+        for line in in_file:
+            yield line.rstrip('\n').split('\t')
+
+
+def batches(rows):
+    """
+    Group a stream of rows into lists of at most BATCH rows.
+    """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest(data_dir, db_file=DATASET_FILE, verbose=False):
+    """
+    Build the SQLite store from the imdb tsv files.
+
+    Only feature films are kept, and only actor and actress credits
+    on those films.  An existing store is replaced.
+
+    Arguments:
+        data_dir -- directory containing the .tsv.gz files
+        db_file -- file name of the SQLite store to create
+        verbose -- display progress messages if true
+    """
+    dname = os.path.dirname(db_file)
+    if dname and not os.path.isdir(dname):
+        os.makedirs(dname)
+    tmp_file = db_file + '.tmp'
+    if os.path.isfile(tmp_file):
+        os.remove(tmp_file)
+    conn = sqlite3.connect(tmp_file)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    for stmt in SCHEMA:
+        conn.execute(stmt)
+    fnames = [os.path.join(data_dir, x) for x in DATASET_FILES]
+    if verbose:
+        print('reading %s' % fnames[0])
+    movies = set()
+
+    def title_rows():
+        for row in read_tsv(fnames[0]):
+            if row[1] != 'movie' or row[4] == '1' or row[5] == '\\N':
+                continue
+            movies.add(row[0])
+            yield (row[0], row[2], plain_title(row[2]), int(row[5]))
+    for batch in batches(title_rows()):
+        conn.executemany('INSERT INTO titles (tconst, title, plain, year) '
+                         'VALUES (?, ?, ?, ?)', batch)
+    if verbose:
+        print('reading %s' % fnames[1])
+    rows = ((int(row[2]), row[0]) for row in read_tsv(fnames[1])
+            if row[0] in movies)
+    for batch in batches(rows):
+        conn.executemany('UPDATE titles SET votes = ? WHERE tconst = ?',
+                         batch)
+    if verbose:
+        print('reading %s' % fnames[2])
+    rows = ((row[0], int(row[1]), row[2]) for row in read_tsv(fnames[2])
+            if row[3] in ('actor', 'actress') and row[0] in movies)
+    for batch in batches(rows):
+        conn.executemany('INSERT INTO principals VALUES (?, ?, ?)', batch)
+    if verbose:
+        print('reading %s' % fnames[3])
+    rows = ((row[0], row[1], plain_name(row[1]))
+            for row in read_tsv(fnames[3]))
+    for batch in batches(rows):
+        conn.executemany('INSERT INTO names VALUES (?, ?, ?)', batch)
+    if verbose:
+        print('indexing %s' % db_file)
+    for stmt in INDEXES:
+        conn.execute(stmt)
+    conn.commit()
+    conn.close()
+    os.replace(tmp_file, db_file)
+
+
+class ImdbStore:
+    """
+    Read only queries against a store built by ingest().
+
+    The methods mirror the web based functions that they replace.
+    """
+    def __init__(self, db_file):
+        self.conn = sqlite3.connect('file:%s?mode=ro' % db_file, uri=True,
+                                    check_same_thread=False)
+
+    def top_movies(self, year, page):
+        """
+        Return one page of the most voted on movies for a year.
+
+        Arguments:
+            year -- year of this search
+            page -- page number (50 movies per page)
+
+        Returns a dictionary of 'title/tt...' links indexed by title,
+        the same as find_movies.collect_data.
+        """
+        rows = self.conn.execute(
+            'SELECT plain, tconst FROM titles WHERE year = ? '
+            'ORDER BY votes DESC, tconst LIMIT ? OFFSET ?',
+            (year, PAGE_SIZE, (page - 1) * PAGE_SIZE)).fetchall()
+        return {row[0]: 'title/' + row[1] for row in rows}
+
+    def cast(self, movie):
+        """
+        Return the [name, 'name/nm...'] list of actors in a movie.
+
+        Arguments:
+            movie -- 'title/tt...' link of the movie
+        """
+        rows = self.conn.execute(
+            'SELECT names.plain, names.nconst FROM principals '
+            'JOIN names ON names.nconst = principals.nconst '
+            'WHERE principals.tconst = ? ORDER BY principals.ordering',
+            (movie.split('/')[-1],)).fetchall()
+        return [[row[0], 'name/' + row[1]] for row in rows]
+
+    def filmography(self, actor):
+        """
+        Return the [title, 'title/tt...'] list of movies of an actor.
+
+        Arguments:
+            actor -- 'name/nm...' link of the actor
+        """
+        rows = self.conn.execute(
+            'SELECT titles.plain, titles.tconst FROM principals '
+            'JOIN titles ON titles.tconst = principals.tconst '
+            'WHERE principals.nconst = ? ORDER BY titles.year DESC',
+            (actor.split('/')[-1],)).fetchall()
+        return [[row[0], 'title/' + row[1]] for row in rows]
+
+    def rank_people(self, peep):
+        """
+        Return the total votes of the movies of the best known person
+        with this name.
+        """
+        row = self.conn.execute(
+            'SELECT MAX(total) FROM (SELECT SUM(titles.votes) AS total '
+            'FROM names JOIN principals ON '
+            'principals.nconst = names.nconst JOIN titles ON '
+            'titles.tconst = principals.tconst WHERE names.plain = ? '
+            'GROUP BY names.nconst)', (peep,)).fetchone()
+        return row[0] or 0
+
+    def rank_movies(self, movie):
+        """
+        Return the votes of the best known movie with this title.
+        """
+        row = self.conn.execute(
+            'SELECT MAX(votes) FROM titles WHERE plain = ?',
+            (movie,)).fetchone()
+        return row[0] or 0
+
+
+_STORE = {'store': None}
+
+
+def open_store(db_file=DATASET_FILE):
+    """
+    Use the store in db_file for all imdb and popularity lookups.
+    """
+    _STORE['store'] = ImdbStore(db_file)
+    return _STORE['store']
+
+
+def get_store():
+    """
+    Return the open ImdbStore, or None when pages are read from the web.
+    """
+    return _STORE['store']
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print('usage: python3 imdb_dataset.py <dataset directory> [db file]')
+        sys.exit(1)
+    ingest(sys.argv[1], *sys.argv[2:3], verbose=True)
@@ -2,7 +2,8 @@
 """
 Create a map of nodes and links and then solve the puzzle.
 """
-import scan_exp
+from array import array
+import word_index
 
 
 class Mnode:
@@ -13,18 +14,23 @@ class Mnode:
     puzzle.  An Mnode has its own name (text form of the coordinates of
     the figure (0,0 is upper left), an indicator whether or not it
     is a square or cricle, a pattern representing the original puzzle
-    number (or ?), a list of possible solutions, and a list of pointers
-    to adjoining Mnodes.
-
-    This also keeps track of found values, rearranges links at the start
-    to handle the (5,2,5) square inconsistency in the Summer of 2018 puzzle,
-    and a list of most recently modified Mnodes.
+    number (or ?), the possible solutions, and a list of pointers
+    to adjoining Mnodes.  The possible solutions are kept in a dictionary
+    of names indexed by imdb link, which keeps them in the order they were
+    found and makes membership checks cheap.
+
+    Links are rearranged at the start to handle the (5,2,5) square
+    inconsistency in the Summer of 2018 puzzle.  When two figures are
+    really the same figure, twin is set on the second one to the name of
+    the first one, and it ends up with the same solution.  Solver state
+    (found values and the nodes waiting to be processed) is kept by
+    solve_nodes.Propagator.
+
+    lengths is the pattern parsed into a tuple of word lengths (None for
+    a question mark), so it does not need to be parsed while solving.
     """
-    answers = []
-    solved_movies = []
-    solved_actors = []
-    fixed_links = []
-    last_mod = []
+    __slots__ = ('verbose', 'odd', 'name', 'type', 'pattern', 'lengths',
+                 'possible', 'linked_nodes', 'twin')
 
     def __init__(self, instring, movies, verbosity):
         self.verbose = verbosity
@@ -33,33 +39,43 @@ class Mnode:
         self.name = parts[1]
         self.type = parts[0]
         self.pattern = parts[2]
-        self.possible = []
+        self.lengths = None
+        self.possible = {}
         self.linked_nodes = []
+        self.twin = None
         if parts[2] == '?':
             return
+        self.lengths = word_index.parse_pattern(self.pattern)
         if self.type == 'S':
             for pos_ans in movies[self.pattern]:
-                self.possible.append(pos_ans)
+                self.possible.setdefault(pos_ans[1], pos_ans[0])
             if len(self.possible) == 1:
                 self.display_progress()
-                self.solved_movies.append(self.possible[0][0])
 
-    def get_associated(self):
+    def get_associated(self, graph):
         """
         Find associations.
 
-        Return a list of associated entries.  For an actor, this would
-        be movies that that person appeared in.  For a movie, it would
-        be the cast.
+        Return the associated entries as a dictionary of names indexed by
+        imdb link.  For an actor, this would be movies that that person
+        appeared in.  For a movie, it would be the cast.
+
+        Arguments:
+            graph -- assoc_graph.AssocGraph used to look up (and remember)
+                     the associations of each possible value
+        """
+        ret_dict = {}
+        for link in self.possible:
+            for other, name in graph.associated(
+                    link, self.type == 'S').items():
+                ret_dict.setdefault(other, name)
+        return ret_dict
+
+    def first_possible(self):
+        """
+        Return the name of the first possible solution.
         """
-        ret_list = []
-        for entry in self.possible:
-            if self.type == 'S':
-                alist = scan_exp.get_actor_from_movie(entry[1])
-            else:
-                alist = scan_exp.get_movie_from_actor(entry[1])
-            ret_list = ret_list + alist
-        return ret_list
+        return next(iter(self.possible.values()))
 
     def display_progress(self):
         """
@@ -70,10 +86,58 @@ class Mnode:
         second part of the program (the second big delay section).
         """
         if self.verbose:
-            print('"' + self.possible[0][0] +
+            print('"' + self.first_possible() +
                   '" has been placed in the puzzle')
 
 
+class PuzzleGraph:
+    """
+    Compact form of the puzzle used by the solver.
+
+    Figures are numbered 0 to n-1 in puzzle.txt order.  nodes[i] is the
+    Mnode of figure i and names[i] its coordinate name, while ids maps
+    names back to numbers.  Links are stored CSR style in two arrays:
+    the neighbors of figure i are targets[offsets[i]:offsets[i+1]], and
+    position k in targets identifies the arc from i to targets[k].
+    twins[i] is the number of the figure that i is a twin of, or -1.
+    """
+    __slots__ = ('nodes', 'names', 'ids', 'offsets', 'targets', 'twins')
+
+    def __init__(self, m_nodes):
+        self.nodes = list(m_nodes.values())
+        self.names = [node.name for node in self.nodes]
+        self.ids = {name: indx for indx, name in enumerate(self.names)}
+        self.offsets = array('i', [0])
+        self.targets = array('i')
+        for node in self.nodes:
+            self.targets.extend(self.ids[x] for x in node.linked_nodes)
+            self.offsets.append(len(self.targets))
+        self.twins = array('i', [self.ids[x.twin] if x.twin else -1
+                                 for x in self.nodes])
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def arcs(self, indx):
+        """
+        Return the range of positions in targets of the links of indx.
+        """
+        return range(self.offsets[indx], self.offsets[indx + 1])
+
+    def neighbors(self, indx):
+        """
+        Return the numbers of the figures linked to figure indx.
+        """
+        return self.targets[self.offsets[indx]:self.offsets[indx + 1]]
+
+    def by_name(self, values):
+        """
+        Convert a list indexed by figure number into a dictionary indexed
+        by coordinate name.
+        """
+        return dict(zip(self.names, values))
+
+
 def get_id(fline):
     """
     Given an input line, get the number/name of this Mnode.
@@ -90,6 +154,8 @@ def link_nodes(ploc, movies, verbosity):
        ploc -- file name of the original puzzle (puzzle.txt)
        movies -- movie information previously found
        verbosity -- print progress messages if true
+
+    Returns a PuzzleGraph.
     """
     m_nodes = {}
     with open(ploc, 'r+') as in_file:
@@ -108,10 +174,7 @@ def link_nodes(ploc, movies, verbosity):
             m_nodes[endpt1].linked_nodes.append(endpt2)
             m_nodes[endpt2].linked_nodes.append(endpt1)
     fix_odd_link(m_nodes)
-    for key in m_nodes:
-        if len(m_nodes[key].possible) == 1:
-            m_nodes[key].last_mod.append(key)
-    return m_nodes
+    return PuzzleGraph(m_nodes)
 
 
 def fix_odd_link(m_nodes):
@@ -120,13 +183,13 @@ def fix_odd_link(m_nodes):
 
     Argument:
         m_node -- list of Mnodes used in the puzzle
+
+    Returns a list of [node, twin] pairs of figures that were joined.
     """
     odd_nodes = []
-    first_node = False
+    fixed_links = []
     for s_node in m_nodes:
         scn_node = m_nodes[s_node]
-        if not first_node:
-            first_node = scn_node
         if len(scn_node.linked_nodes) == 1:
             scn_node.odd = True
             odd_nodes.append(scn_node)
@@ -140,12 +203,14 @@ def fix_odd_link(m_nodes):
                 continue
             if scn_node1.type == scn_node2.type:
                 if scn_node1.pattern == scn_node2.pattern:
-                    first_node.fixed_links.append([scn_node1, scn_node2])
+                    fixed_links.append([scn_node1, scn_node2])
+                    scn_node2.twin = scn_node1.name
                     scn_node1.odd = False
                     scn_node2.odd = False
-    for pair in first_node.fixed_links:
+    for pair in fixed_links:
         last_link = pair[1].linked_nodes[0]
         end_link = m_nodes[last_link]
         end_link.linked_nodes.remove(pair[1].name)
         end_link.linked_nodes.append(pair[0].name)
         pair[0].linked_nodes.append(end_link.name)
+    return fixed_links
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+"""
+Performance counters for one run.
+
+The other modules report what they do here: how long each step takes,
+how many requests are made to each web site and how many bytes are read,
+how often the page and score caches already have what is needed, and how
+much work the solver does.  solve_contest() saves these numbers in
+metrics.json next to answers.json.
+
+Steps timed with phase() may run many times (propagate, for example);
+their times and numbers of calls are added up.
+"""
+import cProfile
+from contextlib import contextmanager
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+_METRICS = {'phases': {}, 'hosts': {}, 'caches': {}, 'solver': {},
+            'lock': threading.Lock()}
+
+
+def reset():
+    """
+    Clear all counters.  Called at the start of each contest.
+    """
+    with _METRICS['lock']:
+        for key in ('phases', 'hosts', 'caches', 'solver'):
+            _METRICS[key] = {}
+
+
+@contextmanager
+def phase(name):
+    """
+    Add the time spent in a with block to the timer of a step.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _METRICS['lock']:
+            timer = _METRICS['phases'].setdefault(
+                name, {'seconds': 0.0, 'calls': 0})
+            timer['seconds'] += elapsed
+            timer['calls'] += 1
+
+
+def count_request(url):
+    """
+    Count a request made to the host of url.
+    """
+    host = urlsplit(url).netloc
+    with _METRICS['lock']:
+        counts = _METRICS['hosts'].setdefault(host,
+                                              {'requests': 0, 'bytes': 0})
+        counts['requests'] += 1
+
+
+def count_bytes(url, size):
+    """
+    Count bytes read from the host of url.
+    """
+    host = urlsplit(url).netloc
+    with _METRICS['lock']:
+        counts = _METRICS['hosts'].setdefault(host,
+                                              {'requests': 0, 'bytes': 0})
+        counts['bytes'] += size
+
+
+def count_cache(cache, hit):
+    """
+    Count a lookup in a cache ('pages' or 'scores').
+    """
+    with _METRICS['lock']:
+        counts = _METRICS['caches'].setdefault(cache,
+                                               {'hits': 0, 'misses': 0})
+        counts['hits' if hit else 'misses'] += 1
+
+
+def set_solver(counters):
+    """
+    Save the solver's counters (a dictionary of numbers).
+    """
+    with _METRICS['lock']:
+        _METRICS['solver'].update(counters)
+
+
+def report():
+    """
+    Return all counters as a dictionary.  Each cache also gets its hit
+    rate.
+    """
+    with _METRICS['lock']:
+        result = json.loads(json.dumps(
+            {key: _METRICS[key] for key in
+             ('phases', 'hosts', 'caches', 'solver')}))
+    for counts in result['caches'].values():
+        total = counts['hits'] + counts['misses']
+        counts['hit_rate'] = counts['hits'] / total if total else 0.0
+    return result
+
+
+def write(fname):
+    """
+    Save the counters in a json file.
+    """
+    with open(fname, 'w') as outfile:
+        json.dump(report(), outfile, indent=2)
+
+
+@contextmanager
+def profiled(fname):
+    """
+    Run a with block under cProfile and save the statistics in fname.
+
+    If fname is None, the block runs without profiling.  The saved file
+    can be read with the pstats module.
+    """
+    if fname is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(fname)
@@ -0,0 +1,297 @@
+#!/usr/bin/python
+"""
+Persistent cache of downloaded web pages.
+
+Pages are stored in an SQLite database indexed by a normalized form of
+their url.  Entries older than the time to live are refetched, and when
+the cache grows past its size limit the least recently used pages are
+removed.  The database lives outside of the games directory so that it
+is shared by every run and every contest.
+"""
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import fetch_scheduler
+import metrics
+import transport
+
+CACHE_FILE = os.path.join('..', 'cache', 'pages.db')
+TTL = 30 * 24 * 60 * 60
+MAX_BYTES = 512 * 1024 * 1024
+CHUNK = 16 * 1024
+
+
+def normalize_url(url):
+    """
+    Reduce a url to the form used as a cache key.
+
+    The scheme and host are lower cased, the fragment and imdb ref_
+    tracking parameters are dropped, the remaining query parameters are
+    sorted, and a trailing slash on the path is removed.
+
+    Arguments:
+        url -- url of a page
+
+    Returns the normalized url.
+    """
+    parts = urlsplit(url.strip())
+    path = parts.path
+    while '//' in path:
+        path = path.replace('//', '/')
+    if len(path) > 1 and path.endswith('/'):
+        path = path[:-1]
+    query = [x for x in parse_qsl(parts.query, keep_blank_values=True)
+             if x[0] != 'ref_']
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path,
+                       urlencode(sorted(query)), ''))
+
+
+class PageCache:
+    """
+    Url indexed page store kept in an SQLite file.
+
+    Each row holds the page text, its size, the time that it was fetched
+    and the time that it was last used.  The last used time drives the
+    least recently used eviction once the total size exceeds max_bytes.
+    The total size is kept in the meta table, and is changed in the same
+    transaction as the pages, so every process sharing the file sees the
+    same total.
+    """
+    def __init__(self, path, ttl=TTL, max_bytes=MAX_BYTES):
+        dname = os.path.dirname(path)
+        if dname and not os.path.isdir(dname):
+            os.makedirs(dname)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60,
+                                    check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS pages ('
+                          'url TEXT PRIMARY KEY, body TEXT, size INTEGER, '
+                          'fetched REAL, used REAL)')
+        self.conn.execute('DROP INDEX IF EXISTS pages_used')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS pages_lru '
+                          'ON pages(used, size)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta ('
+                          'key TEXT PRIMARY KEY, value INTEGER)')
+        self.conn.execute("INSERT OR IGNORE INTO meta SELECT 'total', "
+                          'COALESCE(SUM(size), 0) FROM pages')
+        self.conn.commit()
+        self.total = self.stored_bytes()
+
+    def get(self, url):
+        """
+        Return the cached text of a page, or None if it is not usable.
+
+        Arguments:
+            url -- url of the page (normalized here)
+        """
+        key = normalize_url(url)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT body, size, fetched FROM pages WHERE url = ?',
+                (key,)).fetchone()
+            if row is None:
+                metrics.count_cache('pages', False)
+                return None
+            if now - row[2] > self.ttl:
+                if self.conn.execute('DELETE FROM pages WHERE url = ?',
+                                     (key,)).rowcount:
+                    self.conn.execute("UPDATE meta SET value = value - ? "
+                                      "WHERE key = 'total'", (row[1],))
+                self.conn.commit()
+                self.total -= row[1]
+                metrics.count_cache('pages', False)
+                return None
+            self.conn.execute('UPDATE pages SET used = ? WHERE url = ?',
+                              (now, key))
+            self.conn.commit()
+            metrics.count_cache('pages', True)
+            return row[0]
+
+    def put(self, url, text):
+        """
+        Save the text of a page, evicting old pages if needed.
+
+        Arguments:
+            url -- url of the page (normalized here)
+            text -- text of the page
+        """
+        key = normalize_url(url)
+        now = time.time()
+        size = len(text.encode('utf-8'))
+        with self.lock:
+            self.conn.execute(
+                "UPDATE meta SET value = value + ? - COALESCE((SELECT size "
+                "FROM pages WHERE url = ?), 0) WHERE key = 'total'",
+                (size, key))
+            self.conn.execute('INSERT OR REPLACE INTO pages '
+                              'VALUES (?, ?, ?, ?, ?)',
+                              (key, text, size, now, now))
+            self.total = self.stored_bytes()
+            self.evict()
+            self.conn.commit()
+
+    def stored_bytes(self):
+        """
+        Return the size of all of the pages in the database.
+
+        Other processes (batch_solve workers) add pages to the same file,
+        so the total is read from the meta table instead of being counted
+        here.
+        """
+        return self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'total'").fetchone()[0]
+
+    def evict(self):
+        """
+        Remove least recently used pages until under the size limit.
+
+        Called with the lock held, inside the transaction of put().
+        """
+        removed = 0
+        while self.total - removed > self.max_bytes:
+            rows = self.conn.execute(
+                'SELECT rowid, size FROM pages ORDER BY used LIMIT 100'
+            ).fetchall()
+            if not rows:
+                removed = self.total
+                break
+            for row in rows:
+                self.conn.execute('DELETE FROM pages WHERE rowid = ?',
+                                  (row[0],))
+                removed += row[1]
+                if self.total - removed <= self.max_bytes:
+                    break
+        if removed:
+            self.conn.execute("UPDATE meta SET value = value - ? "
+                              "WHERE key = 'total'", (removed,))
+            self.total -= removed
+
+
+_CACHE = {'path': CACHE_FILE, 'ttl': TTL, 'max_bytes': MAX_BYTES,
+          'cache': None}
+
+
+def configure(path=None, ttl=None, max_bytes=None):
+    """
+    Change the location or limits of the shared page cache.
+
+    Arguments:
+        path -- file name of the SQLite database
+        ttl -- seconds that a page stays valid
+        max_bytes -- total page size kept before evicting pages
+    """
+    if path is not None:
+        _CACHE['path'] = path
+    if ttl is not None:
+        _CACHE['ttl'] = ttl
+    if max_bytes is not None:
+        _CACHE['max_bytes'] = max_bytes
+    _CACHE['cache'] = None
+
+
+def get_cache():
+    """
+    Return the shared PageCache, opening it on first use.
+    """
+    if _CACHE['cache'] is None:
+        _CACHE['cache'] = PageCache(_CACHE['path'], _CACHE['ttl'],
+                                    _CACHE['max_bytes'])
+    return _CACHE['cache']
+
+
+def get_page(url):
+    """
+    Return the text of a web page, using the cache when possible.
+
+    Pages that are not returned successfully are not cached.  Callers
+    asking for the same page at the same time share one request.
+
+    Arguments:
+        url -- url of the page
+    """
+    cache = get_cache()
+    text = cache.get(url)
+    if text is not None:
+        return text
+    with fetch_scheduler.single_flight(normalize_url(url)) as leader:
+        if not leader:
+            text = cache.get(url)
+            if text is not None:
+                metrics.count_cache('coalesced', True)
+                return text
+        ndata = transport.get(url)
+        if ndata.status_code == 200:
+            cache.put(url, ndata.text)
+        return ndata.text
+
+
+def parsed_url(url, version):
+    """
+    Return the cache key of a page read by a parser of some version.
+
+    The parser version is added to the query, so pages that a parser cut
+    short are never mistaken for whole pages, and a new version of the
+    parsers reads its pages again.
+
+    Arguments:
+        url -- url of the page
+        version -- version of the parser (see scan_exp.PARSER_VERSION)
+    """
+    parts = urlsplit(normalize_url(url))
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    query.append(('parser_version', str(version)))
+    return urlunsplit(parts._replace(query=urlencode(sorted(query))))
+
+
+def feed_page(url, parser, version=None):
+    """
+    Feed a web page to an HTMLParser, using the cache when possible.
+
+    A page that is not cached is streamed, and each piece is passed to
+    the parser as it arrives.  When the parser sets its done attribute,
+    the download is stopped.  If version is given, the part of the page
+    that was read is cached under parsed_url(url, version), which is all
+    that parsers of that version need.  Otherwise only whole pages are
+    cached.  A page is only read once when several threads ask for it at
+    the same time (see fetch_scheduler.single_flight).
+
+    Arguments:
+        url -- url of the page
+        parser -- HTMLParser with a done attribute
+        version -- version of the parser, or None
+    """
+    cache = get_cache()
+    key = url if version is None else parsed_url(url, version)
+    text = cache.get(key)
+    if text is not None:
+        parser.feed(text)
+        return
+    with fetch_scheduler.single_flight(normalize_url(key)) as leader:
+        if not leader:
+            text = cache.get(key)
+            if text is not None:
+                metrics.count_cache('coalesced', True)
+                parser.feed(text)
+                return
+        ndata = transport.get(url, stream=True)
+        parts = []
+        whole = True
+        try:
+            if ndata.encoding is None:
+                ndata.encoding = 'utf-8'
+            for chunk in ndata.iter_content(CHUNK, decode_unicode=True):
+                parts.append(chunk)
+                parser.feed(chunk)
+                if parser.done:
+                    whole = False
+                    break
+            metrics.count_bytes(url, ndata.raw.tell())
+        finally:
+            ndata.close()
+        if ndata.status_code == 200 and (whole or version is not None):
+            cache.put(key, ''.join(parts))
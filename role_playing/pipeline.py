@@ -0,0 +1,75 @@
+#!/usr/bin/python
+"""
+Read cast lists while the movie search is still running.
+
+Finding movies and solving are separate steps: the solver only starts
+once every search page of every year has been read, and the first thing
+it does is read the cast list (fullcredits page) of every title pattern
+that matches exactly one movie.  A CreditsPrefetcher is called by
+find_movies.find_films after each search page is added, and reads the
+cast lists of those single matches in background threads, so by the
+time the solver asks for them they are already in the page cache (or
+being read, in which case page_cache shares the request).
+
+A pattern with one match so far may get more matches from later pages.
+Its cast list is still read, since the solver reads the cast of every
+possible movie of a figure before it is finished.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import assoc_graph
+import fetch_scheduler
+import imdb_dataset
+
+PREFETCH_LIMIT = 4
+
+
+class CreditsPrefetcher:
+    """
+    Read the cast lists of single matches found during the movie search.
+
+    At most limit pages are read at the same time.  They are sent with
+    fetch_scheduler priority 1 (one possible value), so when the site is
+    being paced they go ahead of the search pages.  Errors are ignored;
+    the solver reads the page again and reports them.
+    """
+    def __init__(self, limit=PREFETCH_LIMIT):
+        self.pool = ThreadPoolExecutor(max_workers=max(1, limit))
+        self.submitted = set()
+
+    def update(self, mdict):
+        """
+        Start reading the cast lists of the patterns in mdict that now
+        match exactly one movie.  Nothing is done when the offline imdb
+        store is open, since there is no network wait.
+
+        Arguments:
+            mdict -- dictionary of [title, link] lists indexed by pattern
+                     (see find_movies.find_films)
+        """
+        if imdb_dataset.get_store():
+            return
+        for key in sorted(mdict):
+            if len(mdict[key]) != 1:
+                continue
+            link = mdict[key][0][1]
+            if link not in self.submitted:
+                self.submitted.add(link)
+                self.pool.submit(read_credits, link)
+
+    def close(self):
+        """
+        Wait for the pages being read and stop the threads.
+        """
+        self.pool.shutdown(wait=True)
+
+
+def read_credits(link):
+    """
+    Read the cast list of a movie into the page cache.  Run in a worker
+    thread.
+    """
+    with fetch_scheduler.priority(1):
+        try:
+            assoc_graph.fetch(link, True)
+        except Exception:  # pylint: disable=W0703
+            pass
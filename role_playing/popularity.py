@@ -4,10 +4,30 @@ Determine popularity
 
 When there are two or more entries for an actor or movie figure, then the
 most popular one should be picked.
+
+rank_batch() ranks every candidate in a puzzle at once.  The google
+lookups are made in parallel, and scores are saved in a persistent cache
+so that rerunning a puzzle makes no lookups at all.  transport (and with
+it the requests package) is only imported when a lookup is made, so
+redrawing a puzzle whose scores are cached starts quickly.  Transport
+settings given to configure() are applied at that point.
 """
+# pylint: disable=C0415
+from concurrent.futures import ThreadPoolExecutor
 from html.parser import HTMLParser
+import os
 import re
-import requests
+import sqlite3
+import threading
+import time
+import fetch_scheduler
+import imdb_dataset
+import metrics
+
+SCORE_FILE = os.path.join('..', 'cache', 'scores.db')
+SCORE_TTL = 7 * 24 * 60 * 60
+WORKERS = 8
+RANK_PRIORITY = 1000
 
 
 class RatePeople(HTMLParser):
@@ -53,10 +73,19 @@ def rank_people(peep):
 
     Arguments:
         peep -- person's name
+
+    When an offline imdb store is open, the total votes of the person's
+    movies are used instead.  Returns None if the google page could not
+    be read.
     """
+    store = imdb_dataset.get_store()
+    if store:
+        return store.rank_people(peep)
     parm = '+'.join(peep.split(' '))
     page1 = "https://www.google.com/search?q=%s" % parm
-    ndata = requests.get(page1)
+    ndata = get_transport().get(page1)
+    if ndata.status_code != 200:
+        return None
     parser = RatePeople()
     parser.feed(ndata.text)
     return parser.result
@@ -68,11 +97,159 @@ def rank_movies(movie):
 
     Arguments:
         movie -- movie title
+
+    When an offline imdb store is open, the movie's votes are used instead.
+    Returns None if the google page could not be read.
     """
+    store = imdb_dataset.get_store()
+    if store:
+        return store.rank_movies(movie)
     parm = '+'.join(movie.split(' '))
     parm += '+movie'
     page1 = "https://www.google.com/search?q=%s" % parm
-    ndata = requests.get(page1)
+    ndata = get_transport().get(page1)
+    if ndata.status_code != 200:
+        return None
     parser = RateMovies()
     parser.feed(ndata.text)
     return parser.result
+
+
+class ScoreCache:
+    """
+    Popularity scores saved in an SQLite file.
+
+    Scores are indexed by kind ('C' for people, 'S' for movies) and name,
+    and expire ttl seconds after they were looked up.
+    """
+    def __init__(self, path=SCORE_FILE, ttl=SCORE_TTL):
+        dname = os.path.dirname(path)
+        if dname and not os.path.isdir(dname):
+            os.makedirs(dname)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60,
+                                    check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS scores ('
+                          'kind TEXT, name TEXT, score INTEGER, '
+                          'fetched REAL, PRIMARY KEY (kind, name))')
+        self.conn.commit()
+
+    def get(self, kind, name):
+        """
+        Return a saved score, or None if it is missing or expired.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT score, fetched FROM scores WHERE kind = ? AND '
+                'name = ?', (kind, name)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            metrics.count_cache('scores', False)
+            return None
+        metrics.count_cache('scores', True)
+        return row[0]
+
+    def put(self, kind, name, score):
+        """
+        Save a score.
+        """
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO scores '
+                              'VALUES (?, ?, ?, ?)',
+                              (kind, name, score, time.time()))
+            self.conn.commit()
+
+
+_SCORES = {'path': SCORE_FILE, 'ttl': SCORE_TTL, 'cache': None,
+           'transport': None, 'lock': threading.Lock()}
+
+
+def configure(path=None, ttl=None, transport=None):
+    """
+    Change the location or expiration time of the score cache.
+
+    Arguments:
+        path -- file name of the SQLite database
+        ttl -- seconds that a score stays valid
+        transport -- transport.configure() arguments, applied when the
+                     first lookup imports transport (see get_transport)
+    """
+    if path is not None:
+        _SCORES['path'] = path
+    if ttl is not None:
+        _SCORES['ttl'] = ttl
+    if transport is not None:
+        _SCORES['transport'] = transport
+    _SCORES['cache'] = None
+
+
+def get_transport():
+    """
+    Import transport for a lookup, and apply the transport settings given
+    to configure() the first time.
+    """
+    import transport
+    with _SCORES['lock']:
+        if _SCORES['transport']:
+            transport.configure(**_SCORES['transport'])
+            _SCORES['transport'] = None
+    return transport
+
+
+def get_score_cache():
+    """
+    Return the shared ScoreCache, opening it on first use.
+    """
+    if _SCORES['cache'] is None:
+        _SCORES['cache'] = ScoreCache(_SCORES['path'], _SCORES['ttl'])
+    return _SCORES['cache']
+
+
+def rank_batch(people, movies, workers=WORKERS):
+    """
+    Rank many people and movies at once.
+
+    Cached scores are used when they have not expired.  All of the other
+    lookups are made in parallel, and their results are saved.  When an
+    offline imdb store is open, scores come from there and are not cached
+    (they measure votes instead of google results).
+
+    Arguments:
+        people -- names of people to rank
+        movies -- titles of movies to rank
+        workers -- number of lookups made at the same time
+
+    Returns a dictionary of scores indexed by (kind, name), where kind is
+    'C' for people and 'S' for movies.  A lookup that fails scores 0 and
+    is not cached, so it is tried again on the next run.  The lookups
+    have a low fetch_scheduler priority, behind any imdb pages still
+    being read.
+    """
+    wanted = [('C', x) for x in people] + [('S', x) for x in movies]
+    rankers = {'C': rank_people, 'S': rank_movies}
+    if imdb_dataset.get_store():
+        return {key: rankers[key[0]](key[1]) for key in wanted}
+    cache = get_score_cache()
+    scores = {}
+    missing = []
+    for key in wanted:
+        score = cache.get(key[0], key[1])
+        if score is None:
+            missing.append(key)
+        else:
+            scores[key] = score
+    if not missing:
+        return scores
+
+    def rank_one(key):
+        with fetch_scheduler.priority(RANK_PRIORITY):
+            return rankers[key[0]](key[1])
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = pool.map(rank_one, missing)
+        for key, score in zip(missing, results):
+            if score is None:
+                scores[key] = 0
+            else:
+                scores[key] = score
+                cache.put(key[0], key[1], score)
+    return scores
@@ -0,0 +1,333 @@
+#!/usr/bin/python
+"""
+Generate synthetic puzzles for scaling tests.
+
+A puzzle is grown on a grid from a movie/actor association dataset (in
+the bench_server dataset format).  Every figure is a different movie
+(square) or actor (circle), and two figures are linked only if the actor
+is in the cast of the movie, so the puzzle always has a known solution.
+That solution is saved with the puzzle, in the same form as answers.json.
+
+The size and shape are set by:
+    nodes -- number of figures
+    degree -- maximum number of links of a figure (2 to 4)
+    density -- fraction of figures shown as '?'
+    ambiguity -- from 0 to 1.  Near 1, figures are picked whose word
+                 lengths are shared by many other names or titles, so
+                 that more candidates fit each figure.  Near 0, figures
+                 with rare word lengths are picked.
+
+If no dataset is given, a random one is made that is large enough for
+the puzzle.  The output is a benchmark fixture directory (see
+benchmark.py) containing dataset.json, puzzle.txt, fixture.json and
+solution.json.
+
+Usage:
+    python3 puzzle_gen.py [-n nodes] [-d degree] [-q density]
+                          [-a ambiguity] [-s seed] [--dataset file] name
+"""
+import argparse
+import json
+import os
+import random
+import re
+import find_movies
+import word_index
+
+FIXTURES = os.path.join('..', 'bench', 'fixtures')
+DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+MOVIES_PER_YEAR = 250
+LAST_YEAR = 2020
+
+
+def make_word(rng):
+    """
+    Return a random capitalized word of 2 to 9 letters.
+    """
+    size = rng.randint(2, 9)
+    letters = [rng.choice('bcdfghjklmnprstvwz') if indx % 2 == 0 else
+               rng.choice('aeiou') for indx in range(size)]
+    return ''.join(letters).capitalize()
+
+
+def make_dataset(movies, people, cast_size, rng):
+    """
+    Create a random dataset.
+
+    Arguments:
+        movies -- number of movies
+        people -- number of actors
+        cast_size -- number of actors in each movie
+        rng -- random.Random used
+
+    Returns a dictionary in the bench_server dataset format.
+    """
+    dataset = {'movies': {}, 'people': {}, 'cast': {}}
+    for indx in range(people):
+        dataset['people']['nm%d' % (indx + 1)] = {
+            'name': '%s %s' % (make_word(rng), make_word(rng))}
+    actors = sorted(dataset['people'])
+    for indx in range(movies):
+        link = 'tt%d' % (indx + 1)
+        title = ' '.join(make_word(rng) for _ in range(rng.randint(1, 4)))
+        dataset['movies'][link] = {
+            'title': title, 'year': LAST_YEAR - indx // MOVIES_PER_YEAR,
+            'votes': rng.randint(100, 1000000)}
+        dataset['cast'][link] = rng.sample(actors, min(cast_size, people))
+    return dataset
+
+
+class PuzzleGen:
+    """
+    Grow a puzzle on a grid from a dataset.
+
+    Entities are identified by (kind, link) where kind is 'S' for a movie
+    and 'C' for an actor.  placed holds the entity at each grid cell, and
+    links holds the cells linked to each cell.
+    """
+    def __init__(self, dataset, rng):
+        self.dataset = dataset
+        self.rng = rng
+        self.names = {}
+        self.assoc = {}
+        ranked = {}
+        for link, info in dataset['movies'].items():
+            ranked.setdefault(info['year'], []).append(link)
+        for year in ranked:
+            ranked[year].sort(key=lambda x: (-dataset['movies'][x]['votes'],
+                                             x))
+            for link in ranked[year][:find_movies.TOPNMOVIES]:
+                self.names[('S', link)] = clean_name(
+                    dataset['movies'][link]['title'], True)
+        for link, info in dataset['people'].items():
+            self.names[('C', link)] = clean_name(info['name'], False)
+        for movie, actors in dataset['cast'].items():
+            if ('S', movie) not in self.names:
+                continue
+            for actor in actors:
+                self.assoc.setdefault(('S', movie), []).append(('C', actor))
+                self.assoc.setdefault(('C', actor), []).append(('S', movie))
+        self.common = {}
+        for entity, name in self.names.items():
+            key = (entity[0], word_index.word_lengths(name))
+            self.common[key] = self.common.get(key, 0) + 1
+        self.placed = {}
+        self.links = {}
+
+    def commonness(self, entity):
+        """
+        Return the number of entities of the same kind and word lengths.
+        """
+        return self.common[(entity[0],
+                            word_index.word_lengths(self.names[entity]))]
+
+    def pick(self, candidates, ambiguity):
+        """
+        Pick the next entity to place from a list of candidates.
+        """
+        order = sorted(candidates, key=lambda x: (self.commonness(x), x))
+        if self.rng.random() < ambiguity:
+            order.reverse()
+        best = self.commonness(order[0])
+        return self.rng.choice([x for x in order
+                                if self.commonness(x) == best])
+
+    def link(self, cell1, cell2):
+        """
+        Link two cells.
+        """
+        self.links.setdefault(cell1, set()).add(cell2)
+        self.links.setdefault(cell2, set()).add(cell1)
+
+    def grow(self, nodes, degree, ambiguity):
+        """
+        Place up to nodes entities, each linked to at most degree others.
+
+        The puzzle starts with the movie with the largest cast and grows
+        from a randomly chosen figure that still has room for a link.
+        No name is placed twice (the solver never places the same name in
+        two figures, even for different movies or actors).  Afterwards,
+        neighboring cells whose entities are associated are also linked,
+        which adds loops to the puzzle.
+        """
+        used = set()
+        start = max(sorted(self.assoc),
+                    key=lambda x: (x[0] == 'S', len(self.assoc[x])))
+        self.placed[(0, 0)] = start
+        self.links[(0, 0)] = set()
+        used.add(self.names[start])
+        frontier = [(0, 0)]
+        while frontier and len(self.placed) < nodes:
+            cell = frontier[self.rng.randrange(len(frontier))]
+            free = [(cell[0] + dxv, cell[1] + dyv) for dxv, dyv in DIRECTIONS
+                    if (cell[0] + dxv, cell[1] + dyv) not in self.placed]
+            candidates = [x for x in self.assoc[self.placed[cell]]
+                          if self.names[x] not in used]
+            if not free or not candidates or \
+                    len(self.links.get(cell, ())) >= degree:
+                frontier.remove(cell)
+                continue
+            new_cell = self.rng.choice(free)
+            entity = self.pick(candidates, ambiguity)
+            self.placed[new_cell] = entity
+            used.add(self.names[entity])
+            self.link(cell, new_cell)
+            frontier.append(new_cell)
+        for cell in sorted(self.placed):
+            for dxv, dyv in DIRECTIONS[0:2]:
+                other = (cell[0] + dxv, cell[1] + dyv)
+                if other not in self.placed or other in self.links[cell]:
+                    continue
+                if len(self.links[cell]) >= degree or \
+                        len(self.links[other]) >= degree:
+                    continue
+                if self.placed[other] in self.assoc[self.placed[cell]]:
+                    self.link(cell, other)
+
+    def prune_twins(self):
+        """
+        Remove end figures that the solver would mistake for twins.
+
+        link_nodes.fix_odd_link joins figures with one link whose kind
+        and word lengths are the same.  In a generated puzzle these are
+        different entities, so all but one of them are removed.
+        """
+        changed = True
+        while changed:
+            changed = False
+            seen = set()
+            for cell in sorted(self.placed):
+                if len(self.links[cell]) != 1:
+                    continue
+                entity = self.placed[cell]
+                key = (entity[0], word_index.word_lengths(self.names[entity]))
+                if key not in seen:
+                    seen.add(key)
+                    continue
+                other = self.links.pop(cell).pop()
+                self.links[other].discard(cell)
+                del self.placed[cell]
+                changed = True
+
+    def write(self, out_dir, density):
+        """
+        Write puzzle.txt, solution.json and fixture.json in out_dir.
+
+        Cells are shifted so that the smallest coordinates are 0.  Each
+        link is listed on the figure to its left or above it.  A figure
+        is only shown as '?' if it is linked to at least two figures that
+        are not '?', and each of those is still linked to another figure
+        that is not '?', since the solver works out a figure from its
+        neighbors.
+        """
+        min_x = min(x[0] for x in self.placed)
+        min_y = min(x[1] for x in self.placed)
+        cells = sorted(self.placed, key=lambda x: (x[1], x[0]))
+        coord = {x: '%d,%d' % (x[0] - min_x, x[1] - min_y) for x in cells}
+        hidden = set()
+        for cell in self.rng.sample(cells, len(cells)):
+            if self.rng.random() >= density:
+                continue
+            if len([x for x in self.links[cell] if x not in hidden]) < 2:
+                continue
+            if all(len([y for y in self.links[x]
+                        if y not in hidden and y != cell]) > 0
+                   for x in self.links[cell]):
+                hidden.add(cell)
+        lines = []
+        solution = {}
+        for cell in cells:
+            entity = self.placed[cell]
+            name = self.names[entity]
+            text = '?'
+            if cell not in hidden:
+                text = word_index.pattern_string(
+                    word_index.word_lengths(name))
+            later = sorted([x for x in self.links[cell]
+                            if x[0] + x[1] > cell[0] + cell[1]],
+                           key=lambda x: (x[1], x[0]))
+            lines.append('|'.join([entity[0], coord[cell], text,
+                                   ':'.join(coord[x] for x in later)]))
+            solution[coord[cell]] = [name]
+        with open(os.path.join(out_dir, 'puzzle.txt'), 'w') as out_file:
+            out_file.write('\n'.join(lines) + '\n')
+        with open(os.path.join(out_dir, 'solution.json'), 'w') as out_file:
+            json.dump(solution, out_file, indent=1, sort_keys=True)
+        years = [self.dataset['movies'][x[1]]['year']
+                 for x in self.placed.values() if x[0] == 'S']
+        with open(os.path.join(out_dir, 'fixture.json'), 'w') as out_file:
+            json.dump({'year': max(years), 'first': min(years)}, out_file,
+                      indent=1)
+        return len(cells), len(hidden)
+
+
+def clean_name(name, is_movie):
+    """
+    Remove the punctuation that the imdb page scanners remove.
+    """
+    if is_movie:
+        return re.sub("[-:,'!/?]", '', name)
+    return re.sub("[']", '', name)
+
+
+def generate(out_dir, nodes, degree=3, density=0.2, ambiguity=0.5, seed=0,
+             dataset=None):
+    """
+    Generate a puzzle fixture.
+
+    Arguments:
+        out_dir -- fixture directory created
+        nodes -- number of figures wanted
+        degree -- maximum number of links of a figure
+        density -- fraction of figures shown as '?'
+        ambiguity -- 0 (rare word lengths) to 1 (common word lengths)
+        seed -- random seed; the same arguments make the same puzzle
+        dataset -- dataset dictionary (a random one is made if None)
+
+    Returns the number of figures and the number of '?' figures.
+    """
+    rng = random.Random(seed)
+    if dataset is None:
+        dataset = make_dataset(nodes, nodes, 6, rng)
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    with open(os.path.join(out_dir, 'dataset.json'), 'w') as out_file:
+        json.dump(dataset, out_file)
+    puzzle = PuzzleGen(dataset, rng)
+    puzzle.grow(nodes, max(2, min(degree, 4)), ambiguity)
+    puzzle.prune_twins()
+    return puzzle.write(out_dir, density)
+
+
+def main():
+    """
+    Parse the command line and generate a puzzle.
+    """
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Generate a puzzle.')
+    parser.add_argument('-n', '--nodes', type=int, default=100,
+                        help='number of figures')
+    parser.add_argument('-d', '--degree', type=int, default=3,
+                        help='maximum links of a figure (2 to 4)')
+    parser.add_argument('-q', '--density', type=float, default=0.2,
+                        help="fraction of figures shown as '?'")
+    parser.add_argument('-a', '--ambiguity', type=float, default=0.5,
+                        help='0 (rare word lengths) to 1 (common ones)')
+    parser.add_argument('-s', '--seed', type=int, default=0,
+                        help='random seed')
+    parser.add_argument('--dataset',
+                        help='dataset file (default: make a random one)')
+    parser.add_argument('name', help='fixture directory in ../bench/fixtures')
+    args = parser.parse_args()
+    dataset = None
+    if args.dataset:
+        with open(args.dataset, 'r') as in_file:
+            dataset = json.load(in_file)
+    figures, hidden = generate(os.path.join(FIXTURES, args.name), args.nodes,
+                               args.degree, args.density, args.ambiguity,
+                               args.seed, dataset)
+    print('%d figures, %d shown as ?' % (figures, hidden))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,20 @@ Experiments
 """
 from html.parser import HTMLParser
 import re
-import requests
+import entity_store
+import imdb_dataset
+import page_cache
+
+PARSER_VERSION = 2
 
 
 class ActorsInMovieParse(HTMLParser):
     """
     Scan imdb page to determine if an actor was in a given movie
+
+    done is set when the cast table ends.  The rest of the page is not
+    needed.  Pages may be fed in pieces (see page_cache.feed_page), so
+    the text of a name or role can arrive in several handle_data calls.
     """
     # pylint: disable=W0223
     def __init__(self):
@@ -19,12 +27,24 @@ class ActorsInMovieParse(HTMLParser):
         self.name = ''
         self.role = ''
         self.imdb_id = ''
+        self.tables = 0
+        self.done = False
 
     def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == 'table':
+            if self.tables:
+                self.tables += 1
+            for apt in attrs:
+                if apt[0] == 'class' and 'cast_list' in apt[1].split():
+                    self.tables = 1
         if tag == 'td':
             for apt in attrs:
                 if apt[0] == 'itemprop' and apt[1] == 'actor':
                     self.state = 1
+                    self.name = ''
+                    self.role = ''
                 if apt[0] == 'class' and apt[1] == 'character' \
                         and self.state == 4:
                     self.state = 5
@@ -40,12 +60,20 @@ class ActorsInMovieParse(HTMLParser):
                 self.state = 3
 
     def handle_data(self, data):
+        if self.done:
+            return
         if self.state == 3:
-            self.name = data
+            self.name += data
         if self.state == 5:
             self.role += data
 
     def handle_endtag(self, tag):
+        if self.done:
+            return
+        if tag == 'table' and self.tables:
+            self.tables -= 1
+            if not self.tables:
+                self.done = True
         if tag == 'span':
             if self.state == 3:
                 self.state = 4
@@ -60,6 +88,10 @@ class ActorsInMovieParse(HTMLParser):
 class MoviesByActorParse(HTMLParser):
     """
     Scan imdb page to determine if a movie starred a given actor.
+
+    done is set when the heading of the next filmography category is
+    found after the actor (or actress) entries.  The rest of the page is
+    not needed.
     """
     # pylint: disable=W0223
     def __init__(self):
@@ -70,14 +102,22 @@ class MoviesByActorParse(HTMLParser):
         self.prev = 'x'
         self.nownumv = ''
         self.checktxt = ''
+        self.seen = False
+        self.done = False
 
     def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
         if tag == 'div':
             for apt in attrs:
                 if apt[0] == 'id':
                     if apt[1].startswith("actor-") or \
                        apt[1].startswith("actress"):
                         self.state = 1
+                        self.seen = True
+                    if apt[1].startswith("filmo-head-") and self.seen:
+                        self.done = True
+                        return
         if tag == 'a':
             for apt in attrs:
                 if apt[0] == 'href':
@@ -88,10 +128,14 @@ class MoviesByActorParse(HTMLParser):
                             self.nownumv = parts[1].split('_')[-1]
 
     def handle_data(self, data):
+        if self.done:
+            return
         if self.state == 1:
             self.checktxt += data
 
     def handle_endtag(self, tag):
+        if self.done:
+            return
         if self.state == 1:
             if tag == 'div':
                 self.state = 0
@@ -120,11 +164,11 @@ def get_actor_from_movie(movie):
 
     Returns a list of actors in that movie
     """
+    store = imdb_dataset.get_store()
+    if store:
+        return store.cast(movie)
     page1 = "https://www.imdb.com/%s/fullcredits?ref_=tt_cl_sm#cast" % movie
-    ndata = requests.get(page1)
-    parser = ActorsInMovieParse()
-    parser.feed(ndata.text)
-    return parser.result
+    return read_parsed('cast', movie, page1, ActorsInMovieParse())
 
 
 def get_movie_from_actor(actor):
@@ -136,42 +180,36 @@ def get_movie_from_actor(actor):
 
     Returns a list of movies that actor appeared in
     """
+    store = imdb_dataset.get_store()
+    if store:
+        return store.filmography(actor)
     page1 = "https://www.imdb.com/%s" % actor
-    ndata = requests.get(page1)
-    parser = MoviesByActorParse()
-    parser.feed(ndata.text)
-    return parser.result
-
+    return read_parsed('films', actor, page1, MoviesByActorParse())
 
-def pattern_matches(pattern, inputd):
-    """
-    Find specific pattern.
-
-    Determine if the word lengths in a string match a numeric pattern
 
-    Arguements:
-       pattern -- list of word lengths in title or name
-       inputd -- text to be checked
-
-    Returns true or false.
+def read_parsed(kind, link, url, parser):
     """
-    apattern = [len(i) for i in inputd[0].split(' ')]
-    return pattern == apattern
+    Return the list that parser extracts from a page, using the entity
+    store when possible.
 
+    Empty lists are not saved, since they are what a page that could not
+    be read gives.  Change PARSER_VERSION whenever the parsers change, so
+    that lists saved by the old ones are dropped, and pages that the old
+    ones stopped reading part way through are read again.
 
-def find_pattern(pattern, inlist):
+    Arguments:
+        kind -- 'cast' or 'films' (see entity_store)
+        link -- imdb link of the movie or actor
+        url -- url of the page
+        parser -- HTMLParser that extracts the list into parser.result
     """
-    Find general patterns.
-
-    Arguemnents:
-        pattern -- list of lists of numbers.
-        inlist -- list of texts to be checked.
+    store = entity_store.get_store(PARSER_VERSION)
+    if store:
+        alist = store.get(kind, link)
+        if alist is not None:
+            return alist
+    page_cache.feed_page(url, parser, PARSER_VERSION)
+    if store and parser.result:
+        store.put(kind, link, parser.result)
+    return parser.result
 
-    Returns list of entries in inlist that match a pattern in pattern
-    """
-    answer_list = []
-    for searchm in inlist:
-        for searche in searchm:
-            if pattern_matches(pattern, searche):
-                answer_list.append(searche)
-    return answer_list
@@ -2,142 +2,611 @@
 """
 Solve it
 """
-import scan_exp
+from collections import deque
+import json
+import os
+import time
+import assoc_graph
+import fetch_scheduler
+import metrics
+import word_index
 
+SEARCH_BUDGET = 1000
+CHECKPOINT_SECONDS = 60
 
-def solve_nodes(mnodes):
+
+class Propagator:
     """
-    Solve the puzzle.
+    Constraint propagation engine for one puzzle.
+
+    All solver state lives in the instance, so several puzzles can be
+    solved in the same process.  Figures are referred to by their number
+    in the link_nodes.PuzzleGraph.  The state consists of:
+        puzzle -- the PuzzleGraph being solved
+        nodes -- list of Mnodes (puzzle.nodes)
+        worklist -- deque of figure numbers whose possible values changed
+        queued -- flags of the figures currently in worklist (no
+                  duplicates)
+        version -- clock value of the last change to each figure's
+                   possible values
+        arc_seen -- versions of both endpoints the last time that each
+                    arc (position in puzzle.targets) was revised
+        question_marks, qm_seen -- numbers of the '?' figures, and the
+                    versions of each one and its neighbors the last time
+                    its values were worked out
+        solved_actors, solved_movies, answers -- names already placed
+        graph -- assoc_graph.AssocGraph of the casts and filmographies
+                 read so far
+        revisions, pruned, longest -- counts of arcs revised, of possible
+                 values removed, and the longest worklist (see counters())
 
-    Loop through all nodes that have changed.  Terminate when there are
-    no nodes saved in the first in first out node list.  When this is
-    empty all touched nodes have been processed.
+    An arc is only revised again when one of its endpoints has changed
+    since the last revision, so rechecking a node that did not change
+    costs no imdb lookups.
 
-    Arguments:
-        mnodes -- list of Mnodes.
+    If checkpoint is set, the state is saved in that file every interval
+    seconds while propagating, and resume() reloads it.  stamp is saved
+    with the state, and a checkpoint with another stamp is not reloaded
+    (find_movies.discover stamps it with the number of pages read).
     """
-    for dkey in mnodes:
-        first_node = mnodes[dkey].name
-        break
-    while mnodes[first_node].last_mod:
-        thisn = mnodes[first_node].last_mod[0]
-        mnodes[first_node].last_mod = mnodes[first_node].last_mod[1:]
-        for neighbor in mnodes[thisn].linked_nodes:
-            if len(mnodes[neighbor].possible) == 1 or \
-                     mnodes[neighbor].pattern == '?':
+    def __init__(self, puzzle, checkpoint=None,
+                 interval=CHECKPOINT_SECONDS, stamp=None):
+        self.puzzle = puzzle
+        self.nodes = puzzle.nodes
+        self.checkpoint = checkpoint
+        self.interval = interval
+        self.stamp = stamp
+        self.last_save = time.time()
+        self.searching = False
+        self.worklist = deque()
+        self.queued = bytearray(len(puzzle))
+        self.version = [0] * len(puzzle)
+        self.clock = 0
+        self.arc_seen = [None] * len(puzzle.targets)
+        self.graph = assoc_graph.AssocGraph()
+        self.solved_actors = set()
+        self.solved_movies = set()
+        self.answers = set()
+        self.question_marks = [x for x, node in enumerate(self.nodes)
+                               if node.pattern == '?']
+        self.qm_seen = [None] * len(puzzle)
+        self.revisions = 0
+        self.pruned = 0
+        self.longest = 0
+        self.branches = 0
+        self.exhausted = False
+        for indx, node in enumerate(self.nodes):
+            if len(node.possible) == 1:
+                self.record_solved(indx)
+                self.enqueue(indx)
+
+    def enqueue(self, indx):
+        """
+        Add a figure to the end of the worklist unless it is already there.
+        """
+        if not self.queued[indx]:
+            self.queued[indx] = 1
+            self.worklist.append(indx)
+            if len(self.worklist) > self.longest:
+                self.longest = len(self.worklist)
+
+    def set_possible(self, indx, possible):
+        """
+        Replace the possible values of a figure and schedule its arcs.
+        """
+        self.nodes[indx].possible = possible
+        self.touch(indx)
+        self.enqueue(indx)
+
+    def touch(self, indx):
+        """
+        Mark the possible values of a figure as changed.
+
+        Versions come from one clock for the whole puzzle, so a version
+        number is never reused, even after restore_state().
+        """
+        self.clock += 1
+        self.version[indx] = self.clock
+
+    def record_solved(self, indx):
+        """
+        Save the single remaining value of a figure as placed in the puzzle.
+        """
+        node = self.nodes[indx]
+        answer = node.first_possible()
+        if node.pattern == '?':
+            self.answers.add(answer)
+            node.lengths = word_index.word_lengths(answer)
+            node.pattern = word_index.pattern_string(node.lengths)
+        elif node.type == 'S':
+            self.solved_movies.add(answer)
+        else:
+            self.solved_actors.add(answer)
+
+    def propagate(self):
+        """
+        Loop through all nodes that have changed.  Terminate when the
+        worklist is empty.  When this is empty all touched nodes have been
+        processed.
+        """
+        while self.worklist:
+            self.process_head()
+
+    def process_head(self):
+        """
+        Revise the arcs from the figure at the head of the worklist, then
+        remove it from the worklist.
+        """
+        targets = self.puzzle.targets
+        thisn = self.worklist[0]
+        for arc in self.puzzle.arcs(thisn):
+            self.revise(thisn, targets[arc], arc)
+        self.worklist.popleft()
+        self.queued[thisn] = 0
+        self.maybe_checkpoint()
+
+    def stale_arcs(self, thisn):
+        """
+        Return True if revising the arcs from a figure would do any work.
+        """
+        targets = self.puzzle.targets
+        for arc in self.puzzle.arcs(thisn):
+            node = self.nodes[targets[arc]]
+            if len(node.possible) == 1 or node.lengths is None:
                 continue
-            match = []
-            for my_sols in mnodes[thisn].possible:
-                if mnodes[thisn].type == 'S':
-                    alist = scan_exp.get_actor_from_movie(my_sols[1])
-                else:
-                    alist = scan_exp.get_movie_from_actor(my_sols[1])
-                n_pattern = [int(i) for i in
-                             mnodes[neighbor].pattern.split(',')]
-                match = match + scan_exp.find_pattern(n_pattern, [alist])
-            mnodes = merge_nearby(mnodes, neighbor, match, thisn, first_node)
-    return mnodes
-
-
-def merge_nearby(mnodes, neighbor, match, thisn, first_node):
-    """
-    Merge info from touching nodes.
-
-    Arguments:
-        mnodes -- list of Mnodes
-        neighbor -- nearby node.
-        match -- information of entries that match
-        thisn -- neighbor of neighbor used to provide data to shorten
-                 the list of possible values there
-        first_node -- node for keeping track of class variables
-    """
-    change = False
-    if len(mnodes[neighbor].possible) > 1:
-        mergeset = []
-        for entry in mnodes[neighbor].possible:
-            if entry in match:
-                mergeset.append(entry)
-        if len(mnodes[neighbor].possible) != len(mergeset):
-            change = True
-        mnodes[neighbor].possible = mergeset
-    else:
-        mnodes[neighbor].possible = match
-        change = True
-    if len(mnodes[neighbor].possible) == 1:
-        mnodes[neighbor].display_progress()
-        if mnodes[thisn].type == 'S':
-            mnodes[neighbor].solved_actors.append(
-                mnodes[neighbor].possible[0][0])
+            if self.arc_seen[arc] != (self.version[thisn],
+                                      self.version[targets[arc]]):
+                return True
+        return False
+
+    def revise(self, thisn, neighbor, arc):
+        """
+        Reduce the possible values of neighbor to those associated with
+        a possible value of thisn.  Pages read for this have the number of
+        possible values of thisn as their fetch_scheduler priority.
+
+        Arguments:
+            thisn -- figure providing the data
+            neighbor -- nearby figure whose list is shortened
+            arc -- position of this link in puzzle.targets
+        """
+        node = self.nodes[neighbor]
+        if len(node.possible) == 1 or node.lengths is None:
+            return
+        seen = (self.version[thisn], self.version[neighbor])
+        if self.arc_seen[arc] == seen:
+            return
+        self.revisions += 1
+        match = {}
+        is_movie = self.nodes[thisn].type == 'S'
+        with fetch_scheduler.priority(len(self.nodes[thisn].possible)):
+            for link in self.nodes[thisn].possible:
+                index = self.graph.index(link, is_movie)
+                for entry in index.get(node.lengths, []):
+                    match.setdefault(entry[1], entry[0])
+        self.merge_nearby(neighbor, match)
+        self.arc_seen[arc] = (self.version[thisn], self.version[neighbor])
+
+    def merge_nearby(self, neighbor, match):
+        """
+        Merge info from touching nodes.
+
+        Arguments:
+            neighbor -- nearby figure.
+            match -- dictionary of matching names indexed by imdb link
+        """
+        node = self.nodes[neighbor]
+        if len(node.possible) > 1:
+            mergeset = {link: name for link, name in node.possible.items()
+                        if link in match}
+            if len(node.possible) == len(mergeset):
+                return
+            self.pruned += len(node.possible) - len(mergeset)
+        elif not match and not node.possible:
+            return
         else:
-            mnodes[neighbor].solved_movies.append(
-                mnodes[neighbor].possible[0][0])
-    if change:
-        mnodes[first_node].last_mod.append(neighbor)
-    return mnodes
+            mergeset = match
+        self.set_possible(neighbor, mergeset)
+        if len(node.possible) == 1:
+            if not self.searching:
+                node.display_progress()
+            self.record_solved(neighbor)
 
+    def question_mark_sources(self, indx):
+        """
+        Return the neighbors used to find the values of a '?' figure.
 
-def fix_question_marks(mnodes):
-    """
-    Handle nodes with question marks.
+        These are the neighbors with one to three possible values, fewest
+        values first, or an empty list if there are not two of them.
+        """
+        goodn = []
+        for other in self.puzzle.neighbors(indx):
+            if self.nodes[other].possible:
+                if len(self.nodes[other].possible) < 4:
+                    goodn.append(other)
+        if len(goodn) < 2:
+            return []
+        return sorted(goodn, key=lambda x: len(self.nodes[x].possible))
 
-    As nodes get solved, those with question marks are special cases
-    because they are the answers we are seeking, and because they do
-    not have letter information.
+    def fix_question_marks(self):
+        """
+        Handle nodes with question marks.
 
-    This progam repeats cycles of solve_nodes() and fix_question_marks()
-    calls until the entire grid is filled.
+        As nodes get solved, those with question marks are special cases
+        because they are the answers we are seeking, and because they do
+        not have letter information.  The possible values of a '?' figure
+        are the entries associated with every one of its sources (see
+        question_mark_sources), except names already placed elsewhere.
 
-    Arguements:
-        mnodes -- list of nodes
-    """
-    first_node = False
-    for dkey in mnodes:
-        if not first_node:
-            first_node = mnodes[dkey].name
-        if mnodes[dkey].pattern == '?':
-            goodn = []
-            for node in mnodes[dkey].linked_nodes:
-                if mnodes[node].possible:
-                    if len(mnodes[node].possible) < 4:
-                        goodn.append(node)
-            if len(goodn) < 2:
+        A '?' figure is only recomputed when it or one of its neighbors
+        has changed since the last time (qm_seen holds the versions used
+        then).
+        """
+        used = self.solved_actors | self.solved_movies | self.answers
+        version = self.version
+        for indx in self.question_marks:
+            node = self.nodes[indx]
+            if node.pattern != '?':
                 continue
-            g1_assoc = mnodes[goodn[0]].get_associated()
-            g2_assoc = mnodes[goodn[1]].get_associated()
-            for answer in g1_assoc:
-                if answer in g2_assoc:
-                    if answer not in mnodes[dkey].possible:
-                        mnodes[dkey].possible.append(answer)
-            if len(mnodes[dkey].possible) == 1:
-                mnodes[dkey].display_progress()
-                mnodes[first_node].last_mod.append(dkey)
-                mnodes[first_node].answers.append(mnodes[dkey].possible[0][0])
-                n_pattern = [len(x) for x in
-                             mnodes[dkey].possible[0][0].split(' ')]
-                mnodes[dkey].pattern = ','.join([str(x) for x in n_pattern])
-    mnodes = remove_dup_solutions(mnodes, first_node)
-    return mnodes
-
-
-def remove_dup_solutions(mnodes, first_node):
-    """
-    Remove entries found elsewhere in the puzzle.
+            seen = (version[indx],) + tuple(
+                version[x] for x in self.puzzle.neighbors(indx))
+            if self.qm_seen[indx] == seen:
+                continue
+            goodn = self.question_mark_sources(indx)
+            if goodn:
+                possible = self.common_associations(goodn, used)
+                if possible.keys() != node.possible.keys():
+                    node.possible = possible
+                    self.touch(indx)
+                    if len(possible) == 1:
+                        if not self.searching:
+                            node.display_progress()
+                        self.enqueue(indx)
+                        self.record_solved(indx)
+            self.qm_seen[indx] = (version[indx],) + tuple(
+                version[x] for x in self.puzzle.neighbors(indx))
+        self.remove_dup_solutions()
 
-    Arguements:
-        mnodes -- list of puzzle nodes.
-        first_node -- default node to extract common data from
-    """
-    for dkey in mnodes:
-        dlist = []
-        if len(mnodes[dkey].possible) > 1:
-            for entry in mnodes[dkey].possible:
-                nfield = entry[0]
-                if nfield in mnodes[first_node].solved_actors:
-                    dlist.append(entry)
-                if nfield in mnodes[first_node].solved_movies:
-                    dlist.append(entry)
-                if nfield in mnodes[first_node].answers:
-                    dlist.append(entry)
-            for entry in dlist:
-                mnodes[dkey].possible.remove(entry)
-    return mnodes
+    def common_associations(self, goodn, used):
+        """
+        Return the entries associated with every figure in goodn.
+
+        The association sets are intersected in the order of goodn
+        (smallest domain first), and the pages of the remaining figures
+        are not read once nothing is left.
+
+        Arguments:
+            goodn -- figure numbers (see question_mark_sources)
+            used -- names that are already placed
+        """
+        common = {link: name for link, name in
+                  self.nodes[goodn[0]].get_associated(self.graph).items()
+                  if name not in used}
+        for other in goodn[1:]:
+            if not common:
+                break
+            assoc = self.nodes[other].get_associated(self.graph)
+            common = {link: name for link, name in common.items()
+                      if link in assoc}
+        return common
+
+    def remove_dup_solutions(self):
+        """
+        Remove entries found elsewhere in the puzzle.
+        """
+        used = self.solved_actors | self.solved_movies | self.answers
+        for indx, node in enumerate(self.nodes):
+            if len(node.possible) > 1:
+                remaining = {link: name for link, name in
+                             node.possible.items() if name not in used}
+                if len(remaining) != len(node.possible):
+                    self.pruned += len(node.possible) - len(remaining)
+                    self.set_possible(indx, remaining)
+
+    def run(self, search='all', budget=SEARCH_BUDGET):
+        """
+        Solve the puzzle.
+
+        Propagation and question mark handling are repeated until nothing
+        changes.  Then every node that still has several possible values is
+        rechecked in the same way.  Arcs whose endpoints have not changed
+        are skipped during the recheck.  If nodes are still undecided, a
+        backtracking search is made (see search()).  If the search budget
+        runs out in 'all' mode, the solutions found are not a complete list,
+        so the values left by propagation are kept (and search_exhausted is
+        set in the counters).
+
+        Arguments:
+            search -- 'all' to combine every consistent solution found,
+                      'first' to use the first one, or 'off' for no search
+            budget -- maximum number of tentative assignments tried
+
+        Returns a dictionary indexed by figure name of lists of possible
+        answers.
+        """
+        self.settle()
+        for indx in self.open_nodes():
+            self.enqueue(indx)
+        self.settle()
+        self.save_checkpoint()
+        if search != 'off' and self.open_nodes():
+            self.searching = True
+            with metrics.phase('search'):
+                solutions = self.search(search == 'first', budget)
+            self.searching = False
+            if search == 'first' or not self.exhausted:
+                for indx, node in enumerate(self.nodes):
+                    combined = {}
+                    for solution in solutions:
+                        combined.update(solution[indx][0])
+                    if combined:
+                        node.possible = combined
+        for indx, twin in enumerate(self.puzzle.twins):
+            if twin >= 0:
+                self.nodes[indx].possible = self.nodes[twin].possible
+        metrics.set_solver(self.counters())
+        return self.puzzle.by_name(
+            [list(node.possible.values()) for node in self.nodes])
+
+    def settle(self):
+        """
+        Alternate propagate() and fix_question_marks() until the worklist
+        stays empty.
+        """
+        while True:
+            with metrics.phase('propagate'):
+                self.propagate()
+            with metrics.phase('question_mark'):
+                self.fix_question_marks()
+            if not self.worklist:
+                return
+
+    def counters(self):
+        """
+        Return a dictionary of the amount of work done so far.
+        """
+        return {'revisions': self.revisions, 'pruned': self.pruned,
+                'longest_worklist': self.longest, 'branches': self.branches,
+                'search_exhausted': self.exhausted,
+                'fetches': self.graph.fetches,
+                'open_nodes': len(self.open_nodes())}
+
+    def open_nodes(self):
+        """
+        Return the numbers of figures that still have several possible
+        values.
+        """
+        return [x for x, node in enumerate(self.nodes)
+                if len(node.possible) > 1]
+
+    def save_state(self):
+        """
+        Return a copy of the solver state that restore_state() can reload.
+
+        Possible value dictionaries are replaced rather than changed in
+        place, so the dictionaries themselves do not need to be copied.
+        """
+        return ([(node.possible, node.pattern, node.lengths)
+                 for node in self.nodes], list(self.version),
+                set(self.solved_actors), set(self.solved_movies),
+                set(self.answers))
+
+    def restore_state(self, state):
+        """
+        Reload solver state saved by save_state().
+        """
+        for node, values in zip(self.nodes, state[0]):
+            node.possible, node.pattern, node.lengths = values
+        self.version = list(state[1])
+        self.solved_actors = set(state[2])
+        self.solved_movies = set(state[3])
+        self.answers = set(state[4])
+        self.worklist.clear()
+        self.queued = bytearray(len(self.nodes))
+
+    def consistent(self, required, since=-1):
+        """
+        Check that a partial solution can still be completed.
+
+        No node in required may have run out of possible values, no
+        name may be placed in two figures (twins excepted), and every pair
+        of linked figures that both have one value must be associated
+        (propagation never rechecks nodes that are already down to one
+        value).  Only pairs with a figure changed after clock value since
+        are checked for associations; the others were checked by an
+        earlier branch.
+
+        Arguments:
+            required -- numbers of figures that had values when search
+                        started
+            since -- clock value when the current branch started
+        """
+        placed = set()
+        for indx, node in enumerate(self.nodes):
+            if not node.possible:
+                if indx in required:
+                    return False
+                continue
+            if len(node.possible) != 1:
+                continue
+            if self.puzzle.twins[indx] < 0:
+                answer = node.first_possible()
+                if answer in placed:
+                    return False
+                placed.add(answer)
+            for neighbor in self.puzzle.neighbors(indx):
+                if self.version[indx] <= since and \
+                        self.version[neighbor] <= since:
+                    continue
+                if len(self.nodes[neighbor].possible) == 1 and \
+                        not self.linked(indx, neighbor):
+                    return False
+        return True
+
+    def linked(self, indx, neighbor):
+        """
+        Return True if the single values of two figures are associated
+        (the actor appeared in the movie).
+        """
+        link = next(iter(self.nodes[indx].possible))
+        n_link = next(iter(self.nodes[neighbor].possible))
+        return self.graph.connected(link, n_link,
+                                    self.nodes[indx].type == 'S')
+
+    def search(self, first_only=False, budget=SEARCH_BUDGET):
+        """
+        Backtracking search used once propagation stops making progress.
+
+        The node with the fewest remaining values (more than one) is
+        branched on first.  After each tentative assignment, propagation
+        and the remove_dup_solutions() uniqueness rule are run, and
+        branches that leave a node without values or place the same name
+        twice are abandoned.
+
+        Arguments:
+            first_only -- stop after the first consistent solution
+            budget -- maximum number of tentative assignments tried
+
+        Returns a list of solutions.  Each solution is a list indexed by
+        figure number of (possible values, pattern, lengths) tuples.  The
+        solver state is left as it was before the search.  exhausted is set
+        if the budget ran out before every branch was tried, in which case
+        the list may be missing solutions.
+        """
+        required = {x for x, node in enumerate(self.nodes) if node.possible}
+        solutions = []
+        self.branches = 0
+        self.exhausted = False
+        self.branch(required, solutions, first_only, budget)
+        return solutions
+
+    def branch(self, required, solutions, first_only, budget, since=-1):
+        """
+        Recursive part of search().  since is the clock value when this
+        branch's assignment was made (see consistent()).
+        """
+        if not self.consistent(required, since):
+            return
+        choices = self.open_nodes()
+        if not choices:
+            solutions.append(self.save_state()[0])
+            return
+        pick = min(choices, key=lambda x: len(self.nodes[x].possible))
+        for link, name in list(self.nodes[pick].possible.items()):
+            if self.branches >= budget:
+                self.exhausted = True
+                return
+            self.branches += 1
+            state = self.save_state()
+            start = self.clock
+            self.set_possible(pick, {link: name})
+            self.record_solved(pick)
+            self.settle()
+            self.branch(required, solutions, first_only, budget, start)
+            self.restore_state(state)
+            if first_only and solutions:
+                return
+
+    def snapshot(self):
+        """
+        Return the solver state as a json compatible dictionary.
+
+        Figures are saved by coordinate name, not by number.
+        """
+        names = self.puzzle.names
+        nodes = {}
+        for indx, node in enumerate(self.nodes):
+            nodes[names[indx]] = {'possible': [[x, y] for x, y in
+                                               node.possible.items()],
+                                  'pattern': node.pattern,
+                                  'version': self.version[indx]}
+        arcs = []
+        for indx in range(len(self.nodes)):
+            for arc in self.puzzle.arcs(indx):
+                if self.arc_seen[arc] is not None:
+                    arcs.append([names[indx],
+                                 names[self.puzzle.targets[arc]],
+                                 self.arc_seen[arc][0],
+                                 self.arc_seen[arc][1]])
+        return {'nodes': nodes, 'clock': self.clock,
+                'worklist': [names[x] for x in self.worklist],
+                'arc_seen': arcs,
+                'solved_actors': sorted(self.solved_actors),
+                'solved_movies': sorted(self.solved_movies),
+                'answers': sorted(self.answers), 'stamp': self.stamp}
+
+    def load_snapshot(self, snap):
+        """
+        Reload solver state returned by snapshot().
+
+        Returns False, without changing anything, if the snapshot does not
+        match this puzzle (it names other figures or links, or has another
+        stamp).
+        """
+        ids = self.puzzle.ids
+        arc_pos = {}
+        for indx in range(len(self.nodes)):
+            for arc in self.puzzle.arcs(indx):
+                arc_pos[(indx, self.puzzle.targets[arc])] = arc
+        if snap.get('stamp') != self.stamp or \
+                set(snap['nodes']) != set(ids) or \
+                any(x not in ids for x in snap['worklist']) or \
+                any((ids.get(x[0]), ids.get(x[1])) not in arc_pos
+                    for x in snap['arc_seen']):
+            return False
+        for name, entry in snap['nodes'].items():
+            node = self.nodes[ids[name]]
+            node.possible = {x[0]: x[1] for x in entry['possible']}
+            node.pattern = entry['pattern']
+            node.lengths = None
+            if node.pattern != '?':
+                node.lengths = word_index.parse_pattern(node.pattern)
+            self.version[ids[name]] = entry['version']
+        self.clock = snap['clock']
+        self.worklist = deque(ids[x] for x in snap['worklist'])
+        self.queued = bytearray(len(self.nodes))
+        for indx in self.worklist:
+            self.queued[indx] = 1
+        self.arc_seen = [None] * len(self.puzzle.targets)
+        self.qm_seen = [None] * len(self.nodes)
+        for entry in snap['arc_seen']:
+            arc = arc_pos[(ids[entry[0]], ids[entry[1]])]
+            self.arc_seen[arc] = (entry[2], entry[3])
+        self.solved_actors = set(snap['solved_actors'])
+        self.solved_movies = set(snap['solved_movies'])
+        self.answers = set(snap['answers'])
+        return True
+
+    def save_checkpoint(self):
+        """
+        Write the solver state to the checkpoint file (if there is one).
+
+        The file is replaced in one step, so a run that dies while saving
+        leaves the previous checkpoint intact.
+        """
+        if not self.checkpoint or self.searching:
+            return
+        tmp_file = self.checkpoint + '.tmp'
+        with open(tmp_file, 'w') as outfile:
+            json.dump(self.snapshot(), outfile)
+        os.replace(tmp_file, self.checkpoint)
+        self.last_save = time.time()
+
+    def maybe_checkpoint(self):
+        """
+        Save a checkpoint if interval seconds have passed since the last one.
+        """
+        if time.time() - self.last_save >= self.interval:
+            self.save_checkpoint()
+
+    def resume(self):
+        """
+        Reload the checkpoint file left by an interrupted run.
+
+        Returns True if a checkpoint was loaded.  A checkpoint that does
+        not match the puzzle is ignored.
+        """
+        if not self.checkpoint or not os.path.isfile(self.checkpoint):
+            return False
+        with open(self.checkpoint, 'r') as json_file:
+            return self.load_snapshot(json.load(json_file))
@@ -1,36 +1,76 @@
 #!/usr/bin/python
 """
 Collect starting information
+
+Only the modules needed to draw a solution are imported when this module
+is loaded.  The modules that search imdb (and with them the requests
+package) are imported by the steps that use them, so rerunning a puzzle
+whose movies.json and answers.json already exist starts quickly.
 """
+# pylint: disable=C0415
 import configparser
 from datetime import datetime
+import importlib
 import os
 import json
-import find_movies
-import link_nodes
-import solve_nodes
+import time
 import build_html
-import popularity
+import imdb_dataset
+import metrics
 
 
-def start_rtn():
+def start_rtn(ini_files=None, contest=None):
     """
     Read role_playing.ini for starting values
 
+    Arguments:
+        ini_files -- list of ini files to read (later files override
+                     earlier ones).  Defaults to role_playing.ini.
+        contest -- contest to solve, instead of the one in the ini file.
+
     Returns:
         contest: directory in games directory (location of data)
         year: year contest starts (current year if omitted)
         first_year: first year (either year, or year gap (last n years))
+        workers: number of imdb pages fetched at the same time
+        search: search mode used when propagation stalls (all, first, off)
+        search_budget: maximum number of tentative assignments searched
+        checkpoint_seconds: time between saves of the solver state
+        profile: if true, the run is profiled (see solve_contest)
+        solver: serial, or async to read the pages of each frontier at once
+        fetch_limit: most pages read at the same time by the async solver
+        render: script or compact (see build_html)
+        pipeline: if true, cast lists are read during the movie search
+        discovery: full, or lazy to read more search pages only when needed
+        modules: configure() arguments of the modules that read web pages,
+                 indexed by module name (see configure_modules)
 
+    search_budget, checkpoint_seconds and fetch_limit are only included
+    when they are set in the ini file.
     """
-    ini_file = 'role_playing.ini'
+    if ini_files is None:
+        ini_files = ['role_playing.ini']
+    ini_file = ini_files[0]
     try:
         config = configparser.ConfigParser()
-        config.read(ini_file)
+        config.read(ini_files)
         info = config['DEFAULT']
+        if contest is not None:
+            info['contest'] = contest
         verbosity = False
         if 'verbose' in info:
             verbosity = config.getboolean('DEFAULT', 'verbose')
+        workers = 1
+        if 'workers' in info:
+            workers = int(info['workers'])
+        search = info.get('search', 'all')
+        solver = info.get('solver', 'serial')
+        overlap = False
+        if 'pipeline' in info:
+            overlap = config.getboolean('DEFAULT', 'pipeline')
+        profile = False
+        if 'profile' in info:
+            profile = config.getboolean('DEFAULT', 'profile')
         if 'year' in info:
             year = int(info['year'])
         else:
@@ -39,13 +79,64 @@ def start_rtn():
         offset = year - first
         if first < offset:
             first = offset
-        return {'contest': info['contest'], 'year': year, 'first': first,
-                'verbose': verbosity}
+        if info.get('source', 'web') == 'dataset':
+            dbfile = info.get('dataset', imdb_dataset.DATASET_FILE)
+            if not os.path.isfile(dbfile):
+                imdb_dataset.ingest(info['dataset_dir'], dbfile, verbosity)
+            imdb_dataset.open_store(dbfile)
+        modules = {'transport': {}, 'fetch_scheduler': {},
+                   'page_cache': {}, 'entity_store': {}, 'popularity': {}}
+        if 'timeout' in info:
+            modules['transport']['timeout'] = float(info['timeout'])
+        if 'retries' in info:
+            modules['transport']['retries'] = int(info['retries'])
+        if 'connections' in info:
+            modules['transport']['pool_size'] = int(info['connections'])
+        if 'rate' in info:
+            modules['fetch_scheduler']['rate'] = float(info['rate'])
+        if 'cache_days' in info:
+            modules['page_cache']['ttl'] = int(
+                float(info['cache_days']) * 24 * 60 * 60)
+            modules['entity_store']['ttl'] = modules['page_cache']['ttl']
+        if 'score_days' in info:
+            modules['popularity']['ttl'] = int(
+                float(info['score_days']) * 24 * 60 * 60)
+        if 'cache_mb' in info:
+            modules['page_cache']['max_bytes'] = int(
+                float(info['cache_mb']) * 1024 * 1024)
+        params = {'contest': info['contest'], 'year': year, 'first': first,
+                  'verbose': verbosity, 'workers': workers,
+                  'search': search, 'profile': profile, 'solver': solver,
+                  'pipeline': overlap,
+                  'render': info.get('render', 'script'),
+                  'discovery': info.get('discovery', 'full'),
+                  'modules': modules}
+        if 'search_budget' in info:
+            params['search_budget'] = int(info['search_budget'])
+        if 'checkpoint_seconds' in info:
+            params['checkpoint_seconds'] = float(info['checkpoint_seconds'])
+        if 'fetch_limit' in info:
+            params['fetch_limit'] = int(info['fetch_limit'])
+        return params
     except KeyError as errval:
         print("Unable to extract %s from %s" % (errval, ini_file))
         return False
 
 
+def configure_modules(params, names=None):
+    """
+    Import the modules that read web pages and apply the ini file
+    settings to them.
+
+    Arguments:
+        params -- role_playing.ini data (see start_rtn).
+        names -- modules to configure, instead of all of them
+    """
+    for name, settings in params.get('modules', {}).items():
+        if settings and (names is None or name in names):
+            importlib.import_module(name).configure(**settings)
+
+
 def main_program():
     """
     Solve a  Games Magazine role-playing puzzle.
@@ -70,31 +161,170 @@ def main_program():
     entry is a list of possible answers.  When finished, in most cases
     this list will contain only one entry.
 
+    While either long step runs, its progress is saved (crawl.journal
+    and solver.json).  If the program dies, the next run resumes from
+    there.  These files are removed once movies.json or answers.json is
+    written.
+
     After all solutions are found, generate_html is called.
     """
     params = start_rtn()
+    solve_contest(params)
+
+
+def solve_contest(params):
+    """
+    Run all of the steps of main_program for one contest.
+
+    Arguments:
+        params -- role_playing.ini data (see start_rtn).
+
+    Performance counters (see metrics) are saved in metrics.json next to
+    answers.json.  If params['profile'] is set, the run is also profiled
+    with cProfile and the statistics are saved in profile.out.
+
+    Returns a dictionary of the seconds spent finding movies ('crawl'),
+    solving ('solve') and creating the html ('render').  When answers.json
+    is reused, crawl and solve are 0, and the time spent reading it is
+    under 'load'.
+    """
     gpath = os.path.join('..', 'games', params['contest'])
+    profile = None
+    if params.get('profile'):
+        profile = os.path.join(gpath, 'profile.out')
+    metrics.reset()
+    with metrics.profiled(profile):
+        timings = run_steps(params, gpath)
+    metrics.write(os.path.join(gpath, 'metrics.json'))
+    return timings
+
+
+def run_steps(params, gpath):
+    """
+    Find movies, solve and create the html for solve_contest.
+
+    If answers.json exists, only the html is made: movies.json is not
+    read, and the modules that read web pages are only loaded if some
+    figure has several answers to rank.  Then only popularity (and the
+    fetch_scheduler it uses) is configured, and the transport settings
+    wait until a lookup imports transport.
+
+    If params['pipeline'] is set, the cast lists of the movies that are
+    the only match of a title pattern are read while the search goes on
+    (see pipeline.CreditsPrefetcher).
+    """
+    answersf = os.path.join(gpath, 'answers.json')
+    if os.path.isfile(answersf):
+        start = time.time()
+        with open(answersf, 'r') as json_file:
+            answers = json.load(json_file)
+        timings = {'crawl': 0.0, 'solve': 0.0,
+                   'load': time.time() - start}
+        if any(len(x) > 1 for x in answers.values()):
+            import popularity
+            configure_modules(params, ['fetch_scheduler'])
+            modules = params.get('modules', {})
+            popularity.configure(transport=modules.get('transport'),
+                                 **modules.get('popularity', {}))
+    else:
+        import pipeline
+        configure_modules(params)
+        prefetcher = None
+        if params.get('pipeline'):
+            prefetcher = pipeline.CreditsPrefetcher(
+                params.get('fetch_limit', pipeline.PREFETCH_LIMIT))
+        try:
+            timings, answers = find_and_solve(params, gpath, prefetcher)
+        finally:
+            if prefetcher:
+                prefetcher.close()
+    start = time.time()
+    generate_html(os.path.join(gpath, 'puzzle.txt'), answers, gpath,
+                  params.get('render', 'script'))
+    timings['render'] = time.time() - start
+    return timings
+
+
+def find_and_solve(params, gpath, prefetcher):
+    """
+    Find movies (unless movies.json exists) and solve for run_steps.
+
+    If params['discovery'] is lazy and there is no movies.json, the two
+    steps are interleaved by find_movies.discover.
+
+    Returns the timings of the two steps and the answers.
+    """
+    import find_movies
+    timings = {}
     ploc = os.path.join(gpath, 'puzzle.txt')
     moviesf = os.path.join(gpath, 'movies.json')
+    answersf = os.path.join(gpath, 'answers.json')
+    if params.get('discovery') == 'lazy' and not os.path.isfile(moviesf):
+        return discover_and_solve(params, gpath, prefetcher)
+    start = time.time()
     if os.path.isfile(moviesf):
         with open(moviesf, 'r') as json_file:
-            info = json.loads(json_file.read())
+            info = json.load(json_file)
     else:
-        info = find_movies.find_films(ploc, params)
+        journal = os.path.join(gpath, 'crawl.journal')
+        with metrics.phase('crawl'):
+            info = find_movies.find_films(
+                ploc, params, journal, prefetcher.update if prefetcher
+                else None)
         with open(moviesf, 'w') as outfile:
             json.dump(info, outfile)
-    answersf = os.path.join(gpath, 'answers.json')
-    if os.path.isfile(answersf):
-        with open(answersf, 'r') as json_file:
-            answers = json.loads(json_file.read())
-    else:
-        answers = do_searching(ploc, info, params)
-        with open(answersf, 'w') as outfile:
-            json.dump(answers, outfile)
-    generate_html(ploc, answers, gpath)
+        if os.path.isfile(journal):
+            os.remove(journal)
+    timings['crawl'] = time.time() - start
+    start = time.time()
+    answers = do_searching(ploc, info, params)
+    with open(answersf, 'w') as outfile:
+        json.dump(answers, outfile)
+    checkpoint = os.path.join(gpath, 'solver.json')
+    if os.path.isfile(checkpoint):
+        os.remove(checkpoint)
+    timings['solve'] = time.time() - start
+    return timings, answers
+
 
+def discover_and_solve(params, gpath, prefetcher):
+    """
+    Find movies a search page at a time and solve after each page, for
+    find_and_solve (see find_movies.discover).
 
-def generate_html(ploc, answers, gpath):
+    The solver checkpoint is stamped with the number of search pages
+    read, so a checkpoint left by an interrupted run is only resumed by
+    the solve with the same movies.
+    """
+    import find_movies
+    solves = []
+    ploc = os.path.join(gpath, 'puzzle.txt')
+    journal = os.path.join(gpath, 'crawl.journal')
+    checkpoint = os.path.join(gpath, 'solver.json')
+    start = time.time()
+
+    def solve(info, pages):
+        solve_start = time.time()
+        answers = do_searching(ploc, info, params, {'pages': pages})
+        solves.append(time.time() - solve_start)
+        return answers
+    with metrics.phase('discover'):
+        info, answers = find_movies.discover(
+            ploc, params, solve, journal,
+            prefetcher.update if prefetcher else None)
+    timings = {'crawl': time.time() - start - sum(solves),
+               'solve': sum(solves)}
+    with open(os.path.join(gpath, 'movies.json'), 'w') as outfile:
+        json.dump(info, outfile)
+    with open(os.path.join(gpath, 'answers.json'), 'w') as outfile:
+        json.dump(answers, outfile)
+    for fname in (journal, checkpoint):
+        if os.path.isfile(fname):
+            os.remove(fname)
+    return timings, answers
+
+
+def generate_html(ploc, answers, gpath, render='script'):
     """
     Generate the html output
 
@@ -108,68 +338,92 @@ def generate_html(ploc, answers, gpath):
         answers -- dictionary indexed by location of lists of possible answers.
                  When solved, most of these have one entry.
         gpath   -- directory where the files being generated will be stored.
+        render  -- build_html drawing mode ('script' or 'compact')
+
+    When a figure has several possible answers, the most popular one is
+    used.  All of these are ranked together by popularity.rank_batch.
+    A figure with no possible answers keeps its pattern.
 
     Results int the creation of the solutions.txt file.
     """
     with open(ploc, 'r+') as in_file:
         figures = in_file.read().split('\n')
-    txt = ''
-    for entry in figures:
-        if not entry:
-            continue
-        parts = entry.split('|')
-        indx = parts[1]
-        a_var = answers[indx]
-        if len(a_var) > 1:
+    figures = [entry.split('|') for entry in figures if entry]
+    people = set()
+    movies = set()
+    for parts in figures:
+        if len(answers[parts[1]]) > 1:
             if parts[0] == 'C':
-                a_var = sorted(a_var, key=popularity.rank_people, reverse=True)
+                people.update(answers[parts[1]])
             else:
-                a_var = sorted(a_var, key=popularity.rank_movies, reverse=True)
-        parts[2] = a_var[0]
+                movies.update(answers[parts[1]])
+    scores = {}
+    if people or movies:
+        import popularity
+        with metrics.phase('rank'):
+            scores = popularity.rank_batch(sorted(people), sorted(movies))
+    txt = ''
+    for parts in figures:
+        a_var = answers[parts[1]]
+        if len(a_var) > 1:
+            kind = 'C' if parts[0] == 'C' else 'S'
+            a_var = sorted(a_var, key=lambda x: scores[(kind, x)],
+                           reverse=True)
+        if a_var:
+            parts[2] = a_var[0]
         txt += '|'.join(parts)+'\n'
     out_file = os.path.join(gpath, 'solution.txt')
     with open(out_file, 'w') as out_file:
         out_file.write(txt)
-    build_html.generate_html(gpath, 'solution.txt')
+    with metrics.phase('render'):
+        build_html.generate_html(gpath, 'solution.txt', render)
 
 
-def do_searching(ploc, info, params):
+def do_searching(ploc, info, params, stamp=None):
     """
     Main loop of the repeating searches being performed.
 
-    This calls solve_nodes.solve_nodes to fill in squares and circles based
-    on nearby completed entries.  It then tries to fill in pages that have
-    question marks, and removes potential entries that already exist as
-    solutions.  When there are no more candidates for checking left,
-    it ends up making one more pass through the grid rechecking those nodes
-    that still have multsiple possible entries.
+    A solve_nodes.Propagator fills in squares and circles based on nearby
+    completed entries.  It then tries to fill in pages that have question
+    marks, and removes potential entries that already exist as solutions.
+    When there are no more candidates for checking left, it ends up making
+    one more pass through the grid rechecking those nodes that still have
+    multiple possible entries.  If some entries are still undecided, a
+    backtracking search finds the combinations that fit the whole puzzle.
 
-    Finally, it reformats the data to have the page location of the figure
-    and a list of possible answers in that location.  This list gets returned.
+    The solver state is saved in solver.json (next to puzzle.txt) as it
+    runs, and an existing solver.json is resumed from.  If params['solver']
+    is async, an async_solver.AsyncPropagator is used, which reads the
+    pages needed by each frontier concurrently.
+
+    Finally, the data is reformatted to have the page location of the figure
+    and a list of possible answers in that location.  This gets returned.
 
     Arguments:
         ploc -- location of the puzzle.txt file.
         info -- partial solution previously derived.
         params -- role_playing.ini data.
+        stamp -- checkpoint stamp (see solve_nodes.Propagator)
     """
-    mnodes = link_nodes.link_nodes(ploc, info, params['verbose'])
-    for dkey in mnodes:
-        first_node = mnodes[dkey].name
-        break
-    while mnodes[first_node].last_mod:
-        mnodes = solve_nodes.solve_nodes(mnodes)
-        mnodes = solve_nodes.fix_question_marks(mnodes)
-    for dkey in mnodes:
-        if len(mnodes[dkey].possible) > 1:
-            mnodes[first_node].last_mod.append(mnodes[dkey].name)
-    mnodes = solve_nodes.solve_nodes(mnodes)
-    mnodes = solve_nodes.fix_question_marks(mnodes)
-    for entry in mnodes[first_node].fixed_links:
-        entry[1].possible = entry[0].possible
-    answers = {}
-    for node in mnodes:
-        answers[node] = [x[0] for x in mnodes[node].possible]
-    return answers
+    import async_solver
+    import link_nodes
+    import solve_nodes
+    with metrics.phase('link'):
+        puzzle = link_nodes.link_nodes(ploc, info, params['verbose'])
+    checkpoint = os.path.join(os.path.dirname(ploc), 'solver.json')
+    interval = params.get('checkpoint_seconds',
+                          solve_nodes.CHECKPOINT_SECONDS)
+    if params.get('solver') == 'async':
+        solver = async_solver.AsyncPropagator(
+            puzzle, checkpoint, interval,
+            params.get('fetch_limit', async_solver.FETCH_LIMIT), stamp)
+    else:
+        solver = solve_nodes.Propagator(puzzle, checkpoint, interval, stamp)
+    if solver.resume() and params['verbose']:
+        print('resuming from %s' % checkpoint)
+    return solver.run(params.get('search', 'all'),
+                      params.get('search_budget', solve_nodes.SEARCH_BUDGET))
+
 
 if __name__ == "__main__":
     main_program()
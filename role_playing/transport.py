@@ -0,0 +1,144 @@
+#!/usr/bin/python
+"""
+Shared http transport used by all of the page scrapers.
+
+Every web page read by this package goes through get() in this module.
+One requests.Session is shared so that connections to imdb and google
+are kept alive and reused instead of paying for a new TCP and TLS
+handshake on every page.  Each host gets a bounded pool of connections,
+every request has a timeout, and failed requests are retried with
+exponential backoff.  Requests and bytes read are counted per host in
+metrics.
+
+Requests are paced by fetch_scheduler.  Throttling answers (429 and 503)
+are retried here rather than by urllib3, so that the scheduler sees them
+and slows down the whole host instead of just this request.  When pacing
+is off, get() itself waits for the Retry-After time (or the same
+exponential backoff as other failures) before trying again.
+"""
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import fetch_scheduler
+import metrics
+
+TIMEOUT = 30
+RETRIES = 4
+BACKOFF = 0.5
+POOL_SIZE = 8
+RETRY_CODES = (429, 500, 502, 503, 504)
+
+_SESSION = {'timeout': TIMEOUT, 'retries': RETRIES, 'backoff': BACKOFF,
+            'pool_size': POOL_SIZE, 'session': None, 'rewrites': {},
+            'lock': threading.Lock()}
+
+
+def configure(timeout=None, retries=None, backoff=None, pool_size=None,
+              rewrites=None):
+    """
+    Change the transport settings.  The next get() builds a new session.
+
+    Arguments:
+        timeout -- seconds to wait when connecting or reading
+        retries -- number of times a failed request is retried
+        backoff -- backoff factor; retry n waits backoff * 2**(n-1) seconds
+        pool_size -- maximum number of open connections per host
+        rewrites -- dictionary of url prefixes to replace, used to send
+                    requests to a stand-in server (see bench_server)
+    """
+    with _SESSION['lock']:
+        if rewrites is not None:
+            _SESSION['rewrites'] = dict(rewrites)
+        if timeout is not None:
+            _SESSION['timeout'] = timeout
+        if retries is not None:
+            _SESSION['retries'] = retries
+        if backoff is not None:
+            _SESSION['backoff'] = backoff
+        if pool_size is not None:
+            _SESSION['pool_size'] = pool_size
+        if _SESSION['session'] is not None:
+            _SESSION['session'].close()
+        _SESSION['session'] = None
+
+
+def make_session():
+    """
+    Create a requests.Session with pooling and retries set up.
+
+    The pool blocks when all of a host's connections are busy, so
+    pool_size is also the limit on concurrent requests to one host.
+    """
+    retry = Retry(total=_SESSION['retries'],
+                  backoff_factor=_SESSION['backoff'],
+                  status_forcelist=[x for x in RETRY_CODES if x not in
+                                    fetch_scheduler.THROTTLE_CODES],
+                  allowed_methods=frozenset(['GET']),
+                  respect_retry_after_header=True,
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=4,
+                          pool_maxsize=_SESSION['pool_size'],
+                          pool_block=True, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """
+    Return the shared session, creating it on first use.
+    """
+    with _SESSION['lock']:
+        if _SESSION['session'] is None:
+            _SESSION['session'] = make_session()
+        return _SESSION['session']
+
+
+def get(url, **kwargs):
+    """
+    Fetch a page with the shared session.
+
+    Arguments:
+        url -- url of the page
+        kwargs -- extra arguments passed to requests.Session.get
+
+    Returns the requests.Response for this page.  The bytes of a streamed
+    response are counted by the caller (see metrics.count_bytes).
+    """
+    kwargs.setdefault('timeout', _SESSION['timeout'])
+    original = url
+    for prefix, target in _SESSION['rewrites'].items():
+        if url.startswith(prefix):
+            url = target + url[len(prefix):]
+            break
+    for attempt in range(_SESSION['retries'] + 1):
+        fetch_scheduler.acquire(original)
+        metrics.count_request(original)
+        start = time.monotonic()
+        ndata = get_session().get(url, **kwargs)
+        wait = retry_after(ndata)
+        fetch_scheduler.feedback(original, ndata.status_code,
+                                 time.monotonic() - start, wait)
+        if ndata.status_code not in fetch_scheduler.THROTTLE_CODES or \
+                attempt == _SESSION['retries']:
+            break
+        ndata.close()
+        if fetch_scheduler.get_limiter(original) is None:
+            time.sleep(wait if wait else
+                       _SESSION['backoff'] * (2 ** attempt))
+    if not kwargs.get('stream'):
+        metrics.count_bytes(original, len(ndata.content))
+    return ndata
+
+
+def retry_after(ndata):
+    """
+    Return the seconds in a response's Retry-After header, or None.
+    """
+    try:
+        return float(ndata.headers.get('Retry-After', ''))
+    except ValueError:
+        return None
@@ -0,0 +1,49 @@
+#!/usr/bin/python
+"""
+Word length patterns.
+
+Puzzle figures give the lengths of the words in a name or title
+("4,4,3,4" could be "Gone with the Wind").  Patterns are handled here as
+tuples of integers so that they can be used as dictionary keys, and
+lists of candidates are indexed by pattern once so that finding the
+candidates that fit a figure is a single dictionary lookup.
+"""
+
+
+def word_lengths(text):
+    """
+    Return the tuple of word lengths of a name or title.
+
+    For example: Gone with the Wind --> (4, 4, 3, 4)
+    """
+    return tuple(len(i) for i in text.split(' '))
+
+
+def parse_pattern(pattern):
+    """
+    Convert a puzzle pattern ('4,4,3,4') into a tuple of integers.
+    """
+    return tuple(int(i) for i in pattern.split(','))
+
+
+def pattern_string(lengths):
+    """
+    Convert a tuple of word lengths back into puzzle form ('4,4,3,4').
+    """
+    return ','.join(str(i) for i in lengths)
+
+
+def build_index(entries):
+    """
+    Index a list of [name, imdb link] entries by word length pattern.
+
+    Arguments:
+        entries -- list of entries whose first element is a name or title
+
+    Returns a dictionary indexed by word length tuple.  Each value is the
+    list of entries with that pattern, in their original order.
+    """
+    index = {}
+    for entry in entries:
+        index.setdefault(word_lengths(entry[0]), []).append(entry)
+    return index
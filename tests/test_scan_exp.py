@@ -0,0 +1,77 @@
+"""
+Check that the imdb page parsers give the same lists when a page is fed
+in pieces (as page_cache.feed_page does) as when it is fed whole.
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'role_playing'))
+
+import bench_server  # noqa: E402  pylint: disable=C0413
+import scan_exp  # noqa: E402  pylint: disable=C0413
+
+DATASET = {
+    'movies': {'tt1': {'title': 'Gone Away', 'year': 2001, 'votes': 900},
+               'tt2': {'title': 'The Long Night', 'year': 1999,
+                       'votes': 500},
+               'tt3': {'title': 'Sun', 'year': 1995, 'votes': 100}},
+    'people': {'nm1': {'name': 'Alpha Beta'}, 'nm2': {'name': 'Ann Lee'},
+               'nm3': {'name': "Bobb O'Smith"}, 'nm4': {'name': 'Dee Ray'}},
+    'cast': {'tt1': ['nm1', 'nm2', 'nm3', 'nm4'], 'tt2': ['nm4', 'nm1'],
+             'tt3': ['nm4']}}
+
+
+def parse(parser, page, size=None):
+    """
+    Feed a page to a parser, whole or in pieces of size characters.
+    """
+    if size is None:
+        parser.feed(page)
+    else:
+        for start in range(0, len(page), size):
+            parser.feed(page[start:start + size])
+            if parser.done:
+                break
+    return parser.result
+
+
+class ChunkedParseTest(unittest.TestCase):
+    """
+    Whole page and chunked parses of cast lists and filmographies.
+    """
+    def setUp(self):
+        self.site = bench_server.StandInSite(DATASET, filler=2000)
+
+    def check(self, make_parser, page):
+        whole = parse(make_parser(), page)
+        self.assertTrue(whole)
+        for size in range(1, 200):
+            self.assertEqual(parse(make_parser(), page, size), whole,
+                             'pieces of %d characters' % size)
+
+    def test_cast(self):
+        whole = parse(scan_exp.ActorsInMovieParse(),
+                      self.site.credits_page('tt1'))
+        self.assertEqual(whole, [['Alpha Beta', 'name/nm1'],
+                                 ['Ann Lee', 'name/nm2'],
+                                 ['Bobb OSmith', 'name/nm3'],
+                                 ['Dee Ray', 'name/nm4']])
+        for movie in DATASET['movies']:
+            self.check(scan_exp.ActorsInMovieParse,
+                       self.site.credits_page(movie))
+
+    def test_films(self):
+        whole = parse(scan_exp.MoviesByActorParse(),
+                      self.site.name_page('nm4'))
+        self.assertEqual(whole, [['Gone Away', 'title/tt1'],
+                                 ['The Long Night', 'title/tt2'],
+                                 ['Sun', 'title/tt3']])
+        for person in DATASET['people']:
+            self.check(scan_exp.MoviesByActorParse,
+                       self.site.name_page(person))
+
+
+if __name__ == '__main__':
+    unittest.main()